@@ -0,0 +1,178 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+# Sibling modules are imported by name, as in the Streamlit app (works for both
+# "python app/batch.py" and "python -m app.batch")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import doc_cache
+import instrumentation
+from keyword_catalog import get_keyword_catalog, missing_team_message
+
+RESULT_COLUMNS = ["document", "page", "keyword", "datapoints", "sentence", "context"]
+
+# Function to resolve the keywords of the selected datapoints and the datapoints each keyword belongs to
+def select_keywords(catalog, team, indicators, datapoints, extra_keywords):
+    team_catalog = catalog.get(team)
+    if team_catalog is None:
+        raise ValueError(missing_team_message(team))
+
+    keyword_datapoints = {}
+    for indicator in indicators or list(team_catalog):
+        if indicator not in team_catalog:
+            raise ValueError(f"Unknown indicator '{indicator}' for team '{team}'")
+        for datapoint, keywords in team_catalog[indicator].items():
+            if datapoints and datapoint not in datapoints:
+                continue
+            for keyword in keywords:
+                keyword_datapoints.setdefault(keyword, [])
+                if datapoint not in keyword_datapoints[keyword]:
+                    keyword_datapoints[keyword].append(datapoint)
+
+    for keyword in extra_keywords:
+        keyword_datapoints.setdefault(keyword, [])
+    return keyword_datapoints
+
+# Function to list the PDFs of a folder (recursively), in a stable order
+def find_pdfs(input_dir):
+    pdf_paths = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(".pdf"):
+                pdf_paths.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(pdf_paths)
+
+def _init_batch_worker():
+    # Documents are already spread over processes, so each one is parsed serially
+    doc_cache.PARSE_WORKERS = 1
+
+# Function to run the keyword extraction on one PDF and flatten the matches into rows
+def process_document(pdf_path, keyword_datapoints, surrounding_sentences_count):
+    from keyword_extractor import extract_keyword_matches
+
+    metrics_run = instrumentation.start_run(pdf_path)
+    keyword_results = extract_keyword_matches(pdf_path, list(keyword_datapoints), surrounding_sentences_count)
+    instrumentation.finish_run(metrics_run)  # Written to EXTRACTOR_METRICS_JSONL if set
+    rows = []
+    for keyword, matches in keyword_results.items():
+        for page, match_list in matches.items():
+            for match in match_list:
+                rows.append({
+                    "document": pdf_path,
+                    "page": page,
+                    "keyword": keyword,
+                    "datapoints": "; ".join(keyword_datapoints[keyword]),
+                    "sentence": match["text"],
+                    "context": " ".join(match["surrounding_context"]),
+                })
+    return rows
+
+# Function to read the documents already finished by an earlier run
+def load_progress(progress_path):
+    finished = set()
+    if os.path.exists(progress_path):
+        with open(progress_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # A line cut short by a crash
+                if record.get("status") == "done":
+                    finished.add(record["document"])
+    return finished
+
+# Function to append the rows of one finished document to the output.
+# CSV output is appended to; Parquet output is a directory with one part file per document.
+def write_rows(output_path, output_format, rows, part_name):
+    frame = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    if output_format == "parquet":
+        os.makedirs(output_path, exist_ok=True)
+        if not frame.empty:
+            frame.to_parquet(os.path.join(output_path, f"{part_name}.parquet"), index=False)
+    else:
+        write_header = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        frame.to_csv(output_path, mode="a", header=write_header, index=False)
+
+def _output_format(output_path):
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == ".parquet":
+        return "parquet"
+    if extension in (".xlsx", ".xls"):
+        return "excel"
+    return "csv"
+
+# Function to check that pandas has a Parquet engine, before any document is processed
+def check_parquet_engine():
+    if not any(importlib.util.find_spec(engine) for engine in ("pyarrow", "fastparquet")):
+        raise ValueError("Parquet output needs pyarrow or fastparquet (pip install pyarrow), or use a .csv / .xlsx output")
+
+# Function to run the extraction over every PDF, streaming results as documents finish.
+# Finished documents are recorded in <output>.progress.jsonl, so an interrupted run
+# resumes where it stopped.
+def run_batch(input_dir, output_path, keyword_datapoints, surrounding_sentences_count=2, workers=None):
+    output_format = _output_format(output_path)
+    if output_format == "parquet":
+        check_parquet_engine()
+    # Excel cannot be appended to, so rows are streamed to a CSV and converted at the end
+    stream_path = output_path + ".partial.csv" if output_format == "excel" else output_path
+    stream_format = "csv" if output_format == "excel" else output_format
+    progress_path = output_path + ".progress.jsonl"
+
+    finished = load_progress(progress_path)
+    pdf_paths = [path for path in find_pdfs(input_dir) if path not in finished]
+    print(f"{len(finished)} documents already done, {len(pdf_paths)} to process")
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context,
+                             initializer=_init_batch_worker) as executor, \
+            open(progress_path, "a", encoding="utf-8") as progress:
+        futures = {
+            executor.submit(process_document, path, keyword_datapoints, surrounding_sentences_count): path
+            for path in pdf_paths
+        }
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"Error: Unable to process {path}: {e}")
+                record = {"document": path, "status": "error", "error": str(e)}
+            else:
+                write_rows(stream_path, stream_format, rows, hashlib.sha1(path.encode("utf-8")).hexdigest())
+                record = {"document": path, "status": "done", "rows": len(rows)}
+                print(f"[{done_count}/{len(pdf_paths)}] {path}: {len(rows)} matches")
+            progress.write(json.dumps(record) + "\n")
+            progress.flush()
+
+    if output_format == "excel" and os.path.exists(stream_path):
+        pd.read_csv(stream_path).to_excel(output_path, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the keyword extractor over a folder of PDFs.")
+    parser.add_argument("input_dir", help="Folder containing the PDF reports (searched recursively)")
+    parser.add_argument("output", help="Result file: .csv, .parquet (directory of part files) or .xlsx")
+    parser.add_argument("--team", required=True, help="Team whose keyword catalog to use")
+    parser.add_argument("--indicator", action="append", default=[], help="Indicator to include (repeatable, default: all)")
+    parser.add_argument("--datapoint", action="append", default=[], help="Datapoint to include (repeatable, default: all)")
+    parser.add_argument("--keywords", default="", help="Additional keywords (comma-separated)")
+    parser.add_argument("--context", type=int, default=2, help="Number of surrounding sentences to keep")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    extra_keywords = [keyword.strip() for keyword in args.keywords.split(",") if keyword.strip()]
+    keyword_datapoints = select_keywords(get_keyword_catalog(), args.team, args.indicator, args.datapoint, extra_keywords)
+    if not keyword_datapoints:
+        parser.error("No keywords selected.")
+
+    run_batch(args.input_dir, args.output, keyword_datapoints, args.context, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import numpy as np
+
+from doc_cache import tokenize_document
+
+# Columnar store of the sentence chunks of a parsed document:
+#   sentences        list of sentence strings, one per chunk
+#   page_ids         int32 array, 1-based page number of each chunk
+#   starts / ends    int32 arrays, character offsets of each chunk in its page text
+#   boxes            float32 (n, 4) array, bounding box of each chunk on its page
+#   page_texts       the page texts the offsets point into
+#   page_word_boxes  one float32 (n, 4) array of word boxes per page, shared by all
+#                    chunks of that page instead of being copied into every chunk
+#   page_word_texts / page_word_ids  the words of each page and their (block, line, word_no)
+# Everything is plain lists and NumPy arrays, so the store pickles cheaply.
+
+# Function to build the chunk store of a document parsed by doc_cache
+def build_chunk_store(parsed):
+    tokenize_document(parsed)  # Sentence spans are filled lazily by doc_cache
+    sentences = []
+    page_ids = []
+    starts = []
+    ends = []
+    boxes = [np.zeros((0, 4), dtype=np.float32)]
+    for page_index in range(parsed["page_count"]):
+        text = parsed["page_texts"][page_index]
+        for start, end in parsed["sentence_spans"][page_index]:
+            sentences.append(text[start:end])
+            page_ids.append(page_index + 1)
+            starts.append(start)
+            ends.append(end)
+        boxes.append(parsed["sentence_boxes"][page_index])
+
+    return {
+        "doc_hash": parsed["doc_hash"],
+        "sentences": sentences,
+        "page_ids": np.array(page_ids, dtype=np.int32),
+        "starts": np.array(starts, dtype=np.int32),
+        "ends": np.array(ends, dtype=np.int32),
+        "boxes": np.concatenate(boxes),
+        "page_texts": parsed["page_texts"],
+        "page_word_boxes": parsed["page_word_boxes"],
+        "page_word_texts": parsed["page_word_texts"],
+        "page_word_ids": parsed["page_word_ids"],
+    }
+
+# Function to get the number of chunks in a store
+def chunk_count(store):
+    return len(store["sentences"])
+
+# Function to get (sentence, page number, sentence box) for one chunk
+def get_chunk(store, chunk_index):
+    return store["sentences"][chunk_index], int(store["page_ids"][chunk_index]), tuple(store["boxes"][chunk_index].tolist())
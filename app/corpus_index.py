@@ -0,0 +1,248 @@
+import json
+import os
+import pickle
+import threading
+
+import faiss
+import numpy as np
+
+import vector_index
+from doc_cache import CACHE_ROOT, atomic_write
+from instrumentation import span
+
+# Persistent cross-document index. Documents are appended to the open shard, a flat
+# index that takes new vectors without retraining. Adding a document only appends to the
+# open shard's files; nothing already written is rewritten. When the shard reaches
+# SHARD_MAX_VECTORS it is sealed: consolidated once into the configured index type and
+# never written again.
+#   manifest.json       documents (issuer, year, ...) and shards, rewritten atomically; it
+#                       holds the committed length of each open shard file
+#   shard_NNNN.f32      open shard: raw float32 vectors, appended to
+#   shard_NNNN.log      open shard: row log, one pickled record (doc_ids, page_ids,
+#                       sentences) appended per document
+#   shard_NNNN.faiss    sealed shard: FAISS index
+#   shard_NNNN.pkl      sealed shard: row metadata (doc_ids, page_ids, sentences)
+CORPUS_DIR = os.environ.get("EXTRACTOR_CORPUS_DIR", os.path.join(CACHE_ROOT, "corpus"))
+SHARD_MAX_VECTORS = int(os.environ.get("EXTRACTOR_SHARD_MAX_VECTORS", "200000"))
+CORPUS_FORMAT_VERSION = 2
+
+_corpus_lock = threading.RLock()
+_loaded_shards = {}  # shard name -> (vector count, index, rows)
+
+def _manifest_path(corpus_dir):
+    return os.path.join(corpus_dir, "manifest.json")
+
+def _shard_paths(corpus_dir, shard_name):
+    return os.path.join(corpus_dir, f"{shard_name}.faiss"), os.path.join(corpus_dir, f"{shard_name}.pkl")
+
+def _open_shard_paths(corpus_dir, shard_name):
+    return os.path.join(corpus_dir, f"{shard_name}.f32"), os.path.join(corpus_dir, f"{shard_name}.log")
+
+def _write_json(path, data):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    atomic_write(path, write)
+
+def _write_pickle(path, data):
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    atomic_write(path, write)
+
+# Function to read the corpus manifest, or an empty one for a new corpus
+def load_manifest(corpus_dir=CORPUS_DIR):
+    try:
+        with open(_manifest_path(corpus_dir), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {"version": CORPUS_FORMAT_VERSION, "model": None, "index_type": vector_index.INDEX_TYPE,
+                "documents": [], "shards": []}
+    if manifest.get("version") != CORPUS_FORMAT_VERSION:
+        raise ValueError(f"Corpus at {corpus_dir} has format version {manifest.get('version')}, expected {CORPUS_FORMAT_VERSION}")
+    return manifest
+
+def _empty_rows():
+    return {"doc_ids": np.zeros(0, dtype=np.int32), "page_ids": np.zeros(0, dtype=np.int32), "sentences": []}
+
+def _concat_rows(rows, records):
+    return {
+        "doc_ids": np.concatenate([rows["doc_ids"]] + [record["doc_ids"] for record in records]),
+        "page_ids": np.concatenate([rows["page_ids"]] + [record["page_ids"] for record in records]),
+        "sentences": rows["sentences"] + [sentence for record in records for sentence in record["sentences"]],
+    }
+
+# Function to rebuild an open shard from its vector file and row log. Only the lengths the
+# manifest commits are read, so data appended by an add that stopped before the manifest
+# was written is ignored.
+def _read_open_shard(corpus_dir, shard):
+    index = faiss.IndexFlatIP(shard["dimension"])
+    if not shard["vector_count"]:
+        return index, _empty_rows()
+    vectors_path, log_path = _open_shard_paths(corpus_dir, shard["name"])
+    index.add(np.fromfile(vectors_path, dtype=np.float32, count=shard["vector_count"] * shard["dimension"]).reshape(-1, shard["dimension"]))
+    records = []
+    with open(log_path, "rb") as f:
+        while f.tell() < shard["log_bytes"]:
+            records.append(pickle.load(f))
+    return index, _concat_rows(_empty_rows(), records)
+
+# Function to load a shard's index and row metadata, kept in memory until the shard changes
+def load_shard(corpus_dir, shard):
+    key = (corpus_dir, shard["name"])
+    cached = _loaded_shards.get(key)
+    if cached is not None and cached[0] == shard["vector_count"]:
+        return cached[1], cached[2]
+
+    if shard["sealed"]:
+        index_path, rows_path = _shard_paths(corpus_dir, shard["name"])
+        index = vector_index.configure_search(faiss.read_index(index_path))
+        with open(rows_path, "rb") as f:
+            rows = pickle.load(f)
+    else:
+        index, rows = _read_open_shard(corpus_dir, shard)
+    _loaded_shards[key] = (shard["vector_count"], index, rows)
+    return index, rows
+
+# Function to append one document's vectors and rows to the open shard's files. Each file
+# is first cut back to its committed length, dropping what an interrupted add left behind.
+def _append_to_open_shard(corpus_dir, shard, embeddings, record):
+    vectors_path, log_path = _open_shard_paths(corpus_dir, shard["name"])
+    with open(vectors_path, "ab") as f:
+        f.truncate(shard["vector_count"] * shard["dimension"] * embeddings.itemsize)
+        f.write(embeddings.tobytes())
+    data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(log_path, "ab") as f:
+        f.truncate(shard["log_bytes"])
+        f.write(data)
+    shard["log_bytes"] += len(data)
+
+# Function to consolidate a full open shard into the configured index type. The flat index
+# stores the vectors exactly, so they are read back from it instead of being kept twice.
+# Returns the open shard files, which the caller removes once the manifest is written.
+def seal_shard(corpus_dir, shard, index_type):
+    index, rows = load_shard(corpus_dir, shard)
+    if index_type != "flat":
+        embeddings = index.reconstruct_n(0, index.ntotal)
+        index = vector_index.build_index(embeddings, index_type)
+    index_path, rows_path = _shard_paths(corpus_dir, shard["name"])
+    _write_pickle(rows_path, rows)
+    atomic_write(index_path, lambda tmp_path: faiss.write_index(index, tmp_path))
+    shard["sealed"] = True
+    shard["index_type"] = index_type
+    _loaded_shards[(corpus_dir, shard["name"])] = (shard["vector_count"], index, rows)
+    return list(_open_shard_paths(corpus_dir, shard["name"]))
+
+# Function to append one document's chunks and embeddings to the corpus.
+# Returns False if the document is already in it. Existing vectors are never rebuilt;
+# only the open shard is appended to.
+def add_document(chunk_store, embeddings, model_signature, name, issuer="", year=None, corpus_dir=CORPUS_DIR):
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    with _corpus_lock:
+        os.makedirs(corpus_dir, exist_ok=True)
+        manifest = load_manifest(corpus_dir)
+        if manifest["model"] is None:
+            manifest["model"] = model_signature
+        elif manifest["model"] != model_signature:
+            raise ValueError(f"Corpus was built with '{manifest['model']}', not '{model_signature}'")
+        if any(document["doc_hash"] == chunk_store["doc_hash"] for document in manifest["documents"]):
+            return False
+
+        doc_id = len(manifest["documents"])
+        position = 0
+        sealed_files = []
+        while position < len(embeddings):
+            shard = manifest["shards"][-1] if manifest["shards"] and not manifest["shards"][-1]["sealed"] else None
+            if shard is None:
+                shard = {"name": f"shard_{len(manifest['shards']):04d}", "vector_count": 0, "sealed": False, "index_type": "flat",
+                         "dimension": embeddings.shape[1], "log_bytes": 0}
+                manifest["shards"].append(shard)
+            index, rows = load_shard(corpus_dir, shard)
+
+            # A document may span shards when it fills the open one
+            take = min(len(embeddings) - position, SHARD_MAX_VECTORS - shard["vector_count"])
+            part = slice(position, position + take)
+            record = {
+                "doc_ids": np.full(take, doc_id, dtype=np.int32),
+                "page_ids": np.asarray(chunk_store["page_ids"][part], dtype=np.int32),
+                "sentences": list(chunk_store["sentences"][part]),
+            }
+            try:
+                _append_to_open_shard(corpus_dir, shard, embeddings[part], record)
+                index.add(embeddings[part])
+            except (OSError, RuntimeError):
+                _loaded_shards.pop((corpus_dir, shard["name"]), None)  # Do not keep a half-updated index
+                raise
+            shard["vector_count"] += take
+            _loaded_shards[(corpus_dir, shard["name"])] = (shard["vector_count"], index, _concat_rows(rows, [record]))
+            if shard["vector_count"] >= SHARD_MAX_VECTORS:
+                sealed_files += seal_shard(corpus_dir, shard, manifest["index_type"])
+            position += take
+
+        manifest["documents"].append({
+            "doc_hash": chunk_store["doc_hash"],
+            "name": name,
+            "issuer": issuer,
+            "year": year,
+            "page_count": len(chunk_store["page_texts"]),
+            "sentence_count": len(embeddings),
+        })
+        _write_json(_manifest_path(corpus_dir), manifest)
+        for path in sealed_files:
+            os.remove(path)
+    return True
+
+# Function to get the ids of the documents that pass the issuer / year / document filters
+# (None means no filter on that field)
+def matching_documents(manifest, issuers=None, years=None, doc_hashes=None):
+    return [
+        doc_id for doc_id, document in enumerate(manifest["documents"])
+        if (issuers is None or document["issuer"] in issuers)
+        and (years is None or document["year"] in years)
+        and (doc_hashes is None or document["doc_hash"] in doc_hashes)
+    ]
+
+def _search_parameters(index, selector):
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+# Function to search every shard for many queries at once and merge the hits.
+# Returns, per query, up to k dicts with score, document metadata, page and sentence.
+def search_corpus(query_embeddings, k=10, issuers=None, years=None, doc_hashes=None, corpus_dir=CORPUS_DIR):
+    query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+    with _corpus_lock:
+        manifest = load_manifest(corpus_dir)
+        allowed = matching_documents(manifest, issuers, years, doc_hashes)
+        filtered = len(allowed) < len(manifest["documents"])
+        hits = [[] for _ in range(len(query_embeddings))]
+        if not allowed:
+            return hits
+        # The search holds the lock too, as the open shard's index is appended to in place
+        for shard in manifest["shards"]:
+            if not shard["vector_count"]:
+                continue
+            index, rows = load_shard(corpus_dir, shard)
+            params = None
+            if filtered:
+                row_ids = np.flatnonzero(np.isin(rows["doc_ids"], allowed)).astype(np.int64)
+                if not len(row_ids):
+                    continue
+                params = _search_parameters(index, faiss.IDSelectorBatch(row_ids))
+            with span("faiss_search"):
+                scores, indices = index.search(query_embeddings, min(k, index.ntotal), params=params)
+            for query_row in range(len(query_embeddings)):
+                for score, row in zip(scores[query_row], indices[query_row]):
+                    if row >= 0:
+                        hits[query_row].append((float(score), int(rows["doc_ids"][row]), int(rows["page_ids"][row]), rows["sentences"][row]))
+
+    results = []
+    for query_hits in hits:
+        query_hits.sort(key=lambda hit: hit[0], reverse=True)
+        results.append([
+            dict(manifest["documents"][doc_id], score=score, page=page, sentence=sentence)
+            for score, doc_id, page, sentence in query_hits[:k]
+        ])
+    return results
@@ -0,0 +1,99 @@
+import re
+
+import pandas as pd
+import streamlit as st
+
+import corpus_index
+from chunk_store import build_chunk_store, chunk_count
+from doc_cache import load_parsed_document
+from embedding_store import load_or_build_index, model_signature
+from query_extractor import build_vector_database, create_embeddings
+from resources import MODEL_NAME
+from sentence_encoder import encode_sentences
+from vector_index import INDEX_TYPE
+
+YEAR_PATTERN = re.compile(r"(?<!\d)(19|20)\d{2}(?!\d)")
+
+# Function to guess the report year from its file name, e.g. "Acme_ESG_2023.pdf"
+def guess_year(file_name):
+    match = YEAR_PATTERN.search(file_name)
+    return int(match.group(0)) if match else None
+
+# Function to add one uploaded PDF to the corpus, reusing its cached embeddings if the
+# document was already queried on its own
+def add_uploaded_pdf(pdf_file, issuer, year):
+    parsed = load_parsed_document(pdf_file.getvalue())
+    chunk_store = build_chunk_store(parsed)
+    if not chunk_count(chunk_store):
+        return None
+    embeddings, _ = load_or_build_index(parsed["doc_hash"], chunk_store, MODEL_NAME, create_embeddings, build_vector_database, INDEX_TYPE)
+    return corpus_index.add_document(chunk_store, embeddings, model_signature(MODEL_NAME), pdf_file.name, issuer, year)
+
+# Function to show the messages of the last "Add to corpus" run, kept in the session state
+# because the page reruns right after adding so the document list is refreshed
+def show_add_messages():
+    for level, message in st.session_state.pop("corpus_add_messages", []):
+        getattr(st, level)(message)
+
+def run():
+    st.title("📚 Corpus Search")
+    st.markdown("Add reports to a shared corpus once, then search all of them (or a filtered subset) with one query.")
+
+    manifest = corpus_index.load_manifest()
+    documents = pd.DataFrame(manifest["documents"], columns=["name", "issuer", "year", "page_count", "sentence_count", "doc_hash"])
+
+    with st.expander(f"Documents in the corpus ({len(documents)})", expanded=documents.empty):
+        if not documents.empty:
+            st.dataframe(documents.drop(columns=["doc_hash"]))
+
+        pdf_files = st.file_uploader("Add PDF reports", type="pdf", accept_multiple_files=True)
+        uploads = []
+        for i, pdf_file in enumerate(pdf_files or []):
+            name_column, issuer_column, year_column = st.columns([2, 2, 1])
+            name_column.write(pdf_file.name)
+            issuer = issuer_column.text_input("Issuer", key=f"corpus_issuer_{i}")
+            year = year_column.number_input("Year", min_value=1900, max_value=2100, value=guess_year(pdf_file.name), step=1, key=f"corpus_year_{i}")
+            uploads.append((pdf_file, issuer.strip(), int(year) if year else None))
+
+        show_add_messages()
+        if uploads and st.button("Add to corpus"):
+            progress = st.progress(0.0)
+            messages = []
+            for done, (pdf_file, issuer, year) in enumerate(uploads, start=1):
+                try:
+                    added = add_uploaded_pdf(pdf_file, issuer, year)
+                except (ValueError, RuntimeError) as e:  # fitz raises FileDataError (a RuntimeError) for a broken PDF
+                    messages.append(("error", f"{pdf_file.name}: {e}"))
+                else:
+                    if added is None:
+                        messages.append(("warning", f"{pdf_file.name}: no text extracted."))
+                    elif not added:
+                        messages.append(("info", f"{pdf_file.name} is already in the corpus."))
+                progress.progress(done / len(uploads))
+            st.session_state["corpus_add_messages"] = messages
+            st.rerun()
+
+    if documents.empty:
+        st.warning("The corpus is empty. Add some reports first.")
+        return
+
+    # Filters: an empty selection means every issuer / year
+    issuer_column, year_column = st.columns(2)
+    issuers = issuer_column.multiselect("Issuers", sorted(documents["issuer"].dropna().unique()))
+    years = year_column.multiselect("Years", sorted(documents["year"].dropna().astype(int).unique()))
+    top_k = st.number_input("Number of results", min_value=1, max_value=200, value=20, step=1)
+
+    query = st.text_input("Enter your query:")
+    if not query:
+        return
+
+    query_embedding = encode_sentences([query], use_cache=False)
+    results = corpus_index.search_corpus(query_embedding, int(top_k), issuers=issuers or None, years=[int(year) for year in years] or None)[0]
+    if not results:
+        st.info("No matching sentences.")
+        return
+
+    results_df = pd.DataFrame(results)[["score", "name", "issuer", "year", "page", "sentence"]]
+    results_df.columns = ["Score", "Document", "Issuer", "Year", "Page", "Sentence"]
+    st.dataframe(results_df)
+    st.download_button("Download results (CSV)", results_df.to_csv(index=False), file_name="corpus_results.csv", mime="text/csv")
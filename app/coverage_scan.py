@@ -0,0 +1,138 @@
+import heapq
+
+import pandas as pd
+
+from doc_cache import iter_parsed_pages, record_sentence_spans
+from instrumentation import timed
+from keyword_catalog import get_reverse_index
+from keyword_matcher import compile_keyword_matcher, find_keyword_hits, highlight_spans, hits_by_sentence
+from keyword_stats import add_page_counts, counts_frame, keyword_page_matrix, new_keyword_stats, stats_frame
+
+# Coverage scan: every datapoint of an indicator (or of a whole team) is checked against a
+# document in one pass. All their keywords go into one matcher; each hit is mapped back to
+# its datapoints through the catalog's reverse index. Each page's text is scanned once
+# (the matcher's cost barely grows with the number of keywords) and only pages with a hit
+# are split into sentences, so the cost is one pass over the document however many
+# datapoints are included. The result is a datapoint x page hit
+# matrix (keyword_stats, with one row per datapoint) and the best evidence sentences of
+# each datapoint.
+
+# Number of evidence sentences kept per datapoint
+EVIDENCE_PER_DATAPOINT = 3
+
+# Function to list the (indicator, datapoint) pairs of a team, or of one of its indicators
+def coverage_datapoints(catalog, team, indicator=None):
+    indicators = catalog.get(team, {})
+    if indicator is not None:
+        indicators = {indicator: indicators.get(indicator, {})}
+    return [(name, datapoint) for name, datapoints in indicators.items() for datapoint in datapoints]
+
+# Function to map each lowercase keyword to the rows (positions in datapoints) it counts for
+def datapoint_rows_by_term(reverse_index, datapoints):
+    rows = {datapoint: row for row, datapoint in enumerate(datapoints)}
+    rows_by_term = {}
+    for term, pairs in reverse_index.items():
+        term_rows = [rows[tuple(pair)] for pair in pairs if tuple(pair) in rows]
+        if term_rows:
+            rows_by_term[term] = term_rows
+    return rows_by_term
+
+# Function to scan a PDF once for every datapoint of a team (or of one indicator).
+# Returns a coverage dict: the datapoints, their keyword stats (one row per datapoint),
+# the evidence {row: [evidence, ...]} and the page count. Evidence sentences are ranked
+# by the number of distinct keywords of the datapoint they contain, then by hits.
+@timed("coverage_scan")
+def scan_coverage(pdf_source, catalog, team, indicator=None, evidence_count=EVIDENCE_PER_DATAPOINT, progress=None):
+    datapoints = coverage_datapoints(catalog, team, indicator)
+    rows_by_term = datapoint_rows_by_term(get_reverse_index(team), datapoints)
+    matcher = compile_keyword_matcher(list(rows_by_term))
+    stats = new_keyword_stats(datapoints)
+    best = {}  # Row -> heap of (distinct terms, hits, order, evidence)
+    order = 0
+    page_count = 0
+
+    for page_index, page_count, page in iter_parsed_pages(pdf_source):
+        page_number = page_index + 1
+        text = page["page_texts"]
+        if progress is not None:
+            progress(page_number, page_count)
+        hits = find_keyword_hits(matcher, text)
+        if not hits:
+            continue
+
+        page_hits = {}
+        spans = record_sentence_spans(page)
+        for sentence_index, sentence_hits in hits_by_sentence(hits, spans).items():
+            start, end = spans[sentence_index]
+            sentence = text[start:end]
+
+            spans_by_row = {}
+            terms_by_row = {}
+            for hit_start, hit_end, term in sentence_hits:
+                for row in rows_by_term[term]:
+                    spans_by_row.setdefault(row, []).append((hit_start, hit_end))
+                    terms_by_row.setdefault(row, set()).add(term)
+
+            for row, row_spans in spans_by_row.items():
+                page_hits[datapoints[row]] = page_hits.get(datapoints[row], 0) + len(row_spans)
+                order -= 1  # Earlier sentences win ties
+                rank = (len(terms_by_row[row]), len(row_spans), order)
+                heap = best.setdefault(row, [])
+                if len(heap) >= evidence_count and rank <= heap[0][:3]:
+                    continue
+                candidate = rank + ({
+                    "sentence": highlight_spans(sentence, row_spans),
+                    "text": sentence,
+                    "page_number": page_number,
+                    "bbox": tuple(page["sentence_boxes"][sentence_index].tolist()),
+                    "keywords": sorted(terms_by_row[row]),
+                },)
+                if len(heap) < evidence_count:
+                    heapq.heappush(heap, candidate)
+                else:
+                    heapq.heapreplace(heap, candidate)
+
+        add_page_counts(stats, page_number, page_hits)
+
+    if page_count == 0:
+        raise ValueError("The uploaded PDF has no pages.")
+
+    evidence = {row: [candidate[3] for candidate in sorted(heap, key=lambda item: item[:3], reverse=True)]
+                for row, heap in best.items()}
+    return {
+        "team": team,
+        "indicator": indicator,
+        "datapoints": datapoints,
+        "stats": stats,
+        "evidence": evidence,
+        "page_count": page_count,
+    }
+
+# Function to build the coverage table: hits and pages of every datapoint
+def coverage_frame(coverage):
+    frame = stats_frame(coverage["stats"])
+    return pd.DataFrame({
+        "Indicator": [indicator for indicator, _ in coverage["datapoints"]],
+        "Datapoint": [datapoint for _, datapoint in coverage["datapoints"]],
+        "Hits": frame["Occurrences"],
+        "Pages": frame["Pages"],
+        "Page count": frame["Pages"].map(len),
+    })
+
+# Function to build the datapoint x page hit matrix as a table. Only pages with at least
+# one hit are kept as columns, so a long report stays readable.
+def coverage_matrix_frame(coverage):
+    matrix = keyword_page_matrix(coverage["stats"], coverage["page_count"], sparse_output=False)
+    hit_pages = matrix.any(axis=0).nonzero()[0]
+    index = pd.MultiIndex.from_tuples(coverage["datapoints"], names=["Indicator", "Datapoint"]) if coverage["datapoints"] else None
+    return pd.DataFrame(matrix[:, hit_pages], index=index, columns=[f"p{page + 1}" for page in hit_pages])
+
+# Function to export the non-zero (indicator, datapoint, page, hits) counts in long form
+def coverage_counts_frame(coverage):
+    frame = counts_frame(coverage["stats"])
+    return pd.DataFrame({
+        "Indicator": [indicator for indicator, _ in frame["Keyword"]],
+        "Datapoint": [datapoint for _, datapoint in frame["Keyword"]],
+        "Page": frame["Page"],
+        "Hits": frame["Count"],
+    })
@@ -0,0 +1,381 @@
+import hashlib
+import multiprocessing
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from instrumentation import span, timed
+from layout_segmenter import SENTENCE_SPLITTER, page_layout, segment_page
+
+# Cache locations and limits (override with environment variables)
+CACHE_ROOT = os.environ.get("EXTRACTOR_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "key_or_query"))
+PARSED_CACHE_DIR = os.path.join(CACHE_ROOT, "parsed")
+MEMORY_CACHE_ITEMS = int(os.environ.get("EXTRACTOR_MEMORY_CACHE_ITEMS", "8"))
+DISK_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTOR_DISK_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Parallel parsing: worker count, the page threshold below which parsing stays serial and
+# the fewest pages worth giving a worker process. Above the threshold the first
+# PARALLEL_SAMPLE_PAGES pages are parsed serially and timed; the rest only goes to the
+# pool if parsing it serially would take at least PARALLEL_MIN_SECONDS, as most text PDFs
+# parse in about a millisecond per page and are faster without the pool.
+PARSE_WORKERS = int(os.environ.get("EXTRACTOR_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_MIN_PAGES = int(os.environ.get("EXTRACTOR_PARALLEL_MIN_PAGES", "200"))
+PARALLEL_SAMPLE_PAGES = 20
+PARALLEL_MIN_SECONDS = float(os.environ.get("EXTRACTOR_PARALLEL_MIN_SECONDS", "2"))
+MIN_PAGES_PER_WORKER = 25
+
+# Bump when the layout of a parsed document changes so old disk entries are ignored
+PARSED_FORMAT_VERSION = 3
+
+# Per-page lists held by a parsed document. Word boxes are stored once per page as a
+# float32 (n, 4) array, with the word strings and (block, line, word_no) ids alongside.
+# Lines are stored as (start, end) offsets into the page text, boxes and block numbers
+# (see layout_segmenter). Sentence spans and their float32 (n, 4) boxes are filled
+# lazily: a page's entries stay None until a caller asks for its sentences, so the
+# keyword prefilter only pays for segmenting the pages that hit.
+PAGE_FIELDS = ["page_texts", "sentence_spans", "sentence_boxes", "page_line_spans", "page_line_boxes",
+               "page_line_blocks", "page_word_boxes", "page_word_texts", "page_word_ids"]
+LAYOUT_FIELDS = ["page_texts", "page_line_spans", "page_line_boxes", "page_line_blocks"]
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+
+# Function to compute the content hash used as cache key for a PDF
+def document_hash(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+# Function to read the bytes of a PDF given either a file path or the raw bytes
+def read_pdf_bytes(pdf_source):
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        return bytes(pdf_source)
+    with open(pdf_source, "rb") as f:
+        return f.read()
+
+# Function to split fitz word tuples (x0, y0, x1, y1, word, block, line, word_no) into a
+# float32 box array, the word strings and an int32 (block, line, word_no) array
+def columnar_words(words):
+    boxes = np.array([word[:4] for word in words], dtype=np.float32).reshape(-1, 4)
+    texts = [word[4] for word in words]
+    ids = np.array([word[5:8] for word in words], dtype=np.int32).reshape(-1, 3)
+    return boxes, texts, ids
+
+# Function to split a page into sentence spans and boxes, timed as the sentence_tokenize stage
+def _segment_page(text, line_spans, line_boxes, line_blocks):
+    with span("sentence_tokenize"):
+        return segment_page(text, line_spans, line_boxes, line_blocks, SENTENCE_SPLITTER)
+
+# Function to extract the text, line layout and word boxes of one fitz page, as a record
+# with one value per PAGE_FIELDS entry (sentences are left to record_sentence_spans).
+# Both reads share one text page, so the page content is only decoded once.
+def parse_page(page):
+    with span("fitz_extract"):
+        textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+        text, line_spans, line_boxes, line_blocks = page_layout(page, textpage)
+        boxes, texts, ids = columnar_words(page.get_text("words", textpage=textpage))
+    return {
+        "page_texts": text,
+        "sentence_spans": None,
+        "sentence_boxes": None,
+        "page_line_spans": line_spans,
+        "page_line_boxes": line_boxes,
+        "page_line_blocks": line_blocks,
+        "page_word_boxes": boxes,
+        "page_word_texts": texts,
+        "page_word_ids": ids,
+    }
+
+# Function to extract text, line layout and word boxes for the pages in [start, stop) of
+# an open fitz document
+def parse_page_range(doc, start, stop):
+    parsed_pages = {key: [] for key in PAGE_FIELDS}
+    for page_index in range(start, stop):
+        record = parse_page(doc.load_page(page_index))
+        for key in PAGE_FIELDS:
+            parsed_pages[key].append(record[key])
+    return parsed_pages
+
+# Worker side of the parallel parse: the PDF is read from a temporary file, so its bytes
+# are not sent along with every page range. This module and its imports are all a worker
+# loads, which keeps Streamlit and the models out of the worker processes.
+def _parse_page_range_in_worker(pdf_path, start, stop):
+    with fitz.open(pdf_path) as doc:
+        return parse_page_range(doc, start, stop)
+
+# The parse pool is started on first use and shared by every document (and session) of
+# the process, so the worker start-up is paid once instead of once per document
+_parse_pool = None
+_parse_pool_size = 0
+_parse_pool_lock = threading.Lock()
+
+# Function to get the shared parse pool with at least the given number of workers
+def get_parse_pool(workers):
+    global _parse_pool, _parse_pool_size
+    with _parse_pool_lock:
+        if _parse_pool is None or _parse_pool_size < workers:
+            if _parse_pool is not None:
+                _parse_pool.shutdown(wait=False)  # Shards already queued still finish
+            _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _parse_pool_size = workers
+        return _parse_pool
+
+def _drop_parse_pool(pool):
+    global _parse_pool, _parse_pool_size
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool, _parse_pool_size = None, 0
+
+# Function to split the pages in [start, page_count) into contiguous (start, stop) ranges
+def page_shards(page_count, shard_count, start=0):
+    shard_size = max(1, -(-(page_count - start) // shard_count))
+    return [(shard_start, min(shard_start + shard_size, page_count)) for shard_start in range(start, page_count, shard_size)]
+
+# Function to yield the records of the pages in [start, page_count) parsed by the shared
+# pool, in page order, each shard as soon as it completes
+def _iter_pool_records(pdf_bytes, start, page_count, workers):
+    workers = min(workers, -(-(page_count - start) // MIN_PAGES_PER_WORKER))
+    fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
+    pool = get_parse_pool(workers)
+    # A few shards per worker keeps the pool busy when some pages are much slower
+    futures = [pool.submit(_parse_page_range_in_worker, pdf_path, shard_start, shard_stop)
+               for shard_start, shard_stop in page_shards(page_count, workers * 4, start)]
+    try:
+        for future in futures:
+            shard = future.result()
+            for i in range(len(shard["page_texts"])):
+                yield {key: shard[key][i] for key in PAGE_FIELDS}
+    except BrokenProcessPool:
+        _drop_parse_pool(pool)  # A worker died; the next document starts a new pool
+        raise
+    finally:
+        # Also reached when the caller stops early: drop the shards not started yet and
+        # wait for the running ones before removing the file they read
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        os.remove(pdf_path)
+
+# Function to yield the parsed record of every page, in page order, as soon as it is ready.
+# Small documents (or workers=1) are parsed serially. Larger ones are sampled first and
+# only sharded by page range across the shared process pool when their pages are slow
+# enough to make up for it.
+def iter_page_records(pdf_bytes, page_count, workers=None):
+    workers = workers or PARSE_WORKERS
+    serial_count = page_count
+    if workers > 1 and page_count >= PARALLEL_MIN_PAGES:
+        serial_count = PARALLEL_SAMPLE_PAGES
+    parse_seconds = 0.0
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page_index in range(serial_count):
+            started = time.perf_counter()
+            record = parse_page(doc.load_page(page_index))
+            parse_seconds += time.perf_counter() - started
+            yield record
+        if serial_count == page_count:
+            return
+        if parse_seconds / serial_count * (page_count - serial_count) < PARALLEL_MIN_SECONDS:
+            for page_index in range(serial_count, page_count):
+                yield parse_page(doc.load_page(page_index))
+            return
+    yield from _iter_pool_records(pdf_bytes, serial_count, page_count, workers)
+
+# Function to parse a PDF into page texts, line layout and word boxes
+@timed("parse_document")
+def parse_pdf(pdf_bytes, doc_hash=None, workers=None):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = len(doc)
+
+    parsed_pages = {key: [] for key in PAGE_FIELDS}
+    for record in iter_page_records(pdf_bytes, page_count, workers):
+        for key in PAGE_FIELDS:
+            parsed_pages[key].append(record[key])
+
+    return {
+        "format_version": PARSED_FORMAT_VERSION,
+        "sentence_splitter": SENTENCE_SPLITTER,
+        "doc_hash": doc_hash or document_hash(pdf_bytes),
+        "page_count": page_count,
+        **parsed_pages,
+    }
+
+# Function to get the sentence spans of a page record, segmenting the page on first use
+# (the sentence boxes are filled alongside)
+def record_sentence_spans(record):
+    if record["sentence_spans"] is None:
+        spans, boxes = _segment_page(*(record[key] for key in LAYOUT_FIELDS))
+        record["sentence_boxes"] = boxes  # Set before the spans, which mark the page as done
+        record["sentence_spans"] = spans
+    return record["sentence_spans"]
+
+# Function to get the sentence spans of one page (0-based index) of a parsed document,
+# segmenting the page on first use
+def page_sentence_spans(parsed, page_index):
+    spans = parsed["sentence_spans"][page_index]
+    if spans is None:
+        spans, boxes = _segment_page(*(parsed[key][page_index] for key in LAYOUT_FIELDS))
+        parsed["sentence_boxes"][page_index] = boxes
+        parsed["sentence_spans"][page_index] = spans
+    return spans
+
+# Function to get the sentences of one page (0-based index) from a parsed document
+def page_sentences(parsed, page_index):
+    text = parsed["page_texts"][page_index]
+    return [text[start:end] for start, end in page_sentence_spans(parsed, page_index)]
+
+# Function to segment every page of a parsed document that is not segmented yet. The
+# disk cache entry is rewritten when pages were added, so later loads skip the work.
+def tokenize_document(parsed):
+    missing = [page_index for page_index, spans in enumerate(parsed["sentence_spans"]) if spans is None]
+    for page_index in missing:
+        page_sentence_spans(parsed, page_index)
+    if missing:
+        _disk_put(parsed["doc_hash"], parsed)
+    return parsed
+
+# Function to get the (boxes, texts, ids) words of one page (0-based index) of a document
+# held in the memory cache, or None if it is not there
+def cached_page_words(doc_hash, page_index):
+    parsed = _memory_get(doc_hash)
+    if parsed is None or page_index >= parsed["page_count"]:
+        return None
+    return parsed["page_word_boxes"][page_index], parsed["page_word_texts"][page_index], parsed["page_word_ids"][page_index]
+
+def _disk_path(doc_hash):
+    return os.path.join(PARSED_CACHE_DIR, f"{doc_hash}.pkl")
+
+def _memory_get(doc_hash):
+    with _memory_lock:
+        parsed = _memory_cache.get(doc_hash)
+        if parsed is not None:
+            _memory_cache.move_to_end(doc_hash)
+        return parsed
+
+def _memory_put(doc_hash, parsed):
+    with _memory_lock:
+        _memory_cache[doc_hash] = parsed
+        _memory_cache.move_to_end(doc_hash)
+        while len(_memory_cache) > MEMORY_CACHE_ITEMS:
+            _memory_cache.popitem(last=False)
+
+def _disk_get(doc_hash):
+    path = _disk_path(doc_hash)
+    try:
+        with open(path, "rb") as f:
+            parsed = pickle.load(f)
+        os.utime(path)  # Mark as recently used for eviction
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if parsed.get("format_version") != PARSED_FORMAT_VERSION or parsed.get("sentence_splitter") != SENTENCE_SPLITTER:
+        return None
+    return parsed
+
+# Function to replace a file atomically: write(tmp_path) fills a temporary file in the same
+# directory, which then replaces path, so readers never see a partial file. The temporary
+# file is removed if the write fails.
+def atomic_write(path, write):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _disk_put(doc_hash, parsed):
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    try:
+        os.makedirs(PARSED_CACHE_DIR, exist_ok=True)
+        atomic_write(_disk_path(doc_hash), write)
+    except OSError as e:
+        print(f"Error: Unable to write parsed document cache: {e}")
+        return
+    evict_disk_cache(PARSED_CACHE_DIR, DISK_CACHE_MAX_BYTES)
+
+# Function to delete the least recently used files of a cache directory above a size budget
+def evict_disk_cache(cache_dir, max_bytes):
+    entries = []
+    total_size = 0
+    for entry in os.scandir(cache_dir):
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+    for _, size, path in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except OSError:
+            pass
+
+# Function to load a parsed PDF from the memory cache, the disk cache or by parsing it
+def load_parsed_document(pdf_source):
+    pdf_bytes = read_pdf_bytes(pdf_source)
+    doc_hash = document_hash(pdf_bytes)
+
+    parsed = _memory_get(doc_hash)
+    if parsed is not None:
+        return parsed
+
+    parsed = _disk_get(doc_hash)
+    if parsed is None:
+        parsed = parse_pdf(pdf_bytes, doc_hash)
+        _disk_put(doc_hash, parsed)
+
+    _memory_put(doc_hash, parsed)
+    return parsed
+
+# Function to yield (page index, page count, page record) page by page, so callers can
+# show results before the whole document is parsed. A cached document is replayed from
+# the cache; a parse that runs to the end is cached like load_parsed_document. Sentence
+# spans the caller adds to a record (record_sentence_spans) are kept in the document.
+def iter_parsed_pages(pdf_source):
+    pdf_bytes = read_pdf_bytes(pdf_source)
+    doc_hash = document_hash(pdf_bytes)
+
+    parsed = _memory_get(doc_hash)
+    if parsed is None:
+        parsed = _disk_get(doc_hash)
+        if parsed is not None:
+            _memory_put(doc_hash, parsed)
+    if parsed is not None:
+        for page_index in range(parsed["page_count"]):
+            record = {key: parsed[key][page_index] for key in PAGE_FIELDS}
+            yield page_index, parsed["page_count"], record
+            if parsed["sentence_spans"][page_index] is None:
+                parsed["sentence_boxes"][page_index] = record["sentence_boxes"]
+                parsed["sentence_spans"][page_index] = record["sentence_spans"]
+        return
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = len(doc)
+    parsed_pages = {key: [] for key in PAGE_FIELDS}
+    for page_index, record in enumerate(iter_page_records(pdf_bytes, page_count)):
+        yield page_index, page_count, record
+        for key in PAGE_FIELDS:
+            parsed_pages[key].append(record[key])
+
+    parsed = {
+        "format_version": PARSED_FORMAT_VERSION,
+        "sentence_splitter": SENTENCE_SPLITTER,
+        "doc_hash": doc_hash,
+        "page_count": page_count,
+        **parsed_pages,
+    }
+    _disk_put(doc_hash, parsed)
+    _memory_put(doc_hash, parsed)
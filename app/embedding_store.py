@@ -0,0 +1,106 @@
+import hashlib
+import importlib.metadata
+import os
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+from chunk_store import chunk_count
+from doc_cache import CACHE_ROOT, PARSED_FORMAT_VERSION, atomic_write, evict_disk_cache
+from layout_segmenter import SENTENCE_SPLITTER
+
+# Embedding cache location and limits (override with environment variables)
+EMBEDDING_CACHE_DIR = os.path.join(CACHE_ROOT, "embeddings")
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTOR_EMBEDDING_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))
+MEMORY_INDEX_ITEMS = int(os.environ.get("EXTRACTOR_MEMORY_INDEX_ITEMS", "4"))
+
+# Bump when the way embeddings or indexes are built changes so old entries are ignored
+EMBEDDING_FORMAT_VERSION = 3
+
+_memory_indexes = OrderedDict()
+_memory_lock = threading.Lock()
+
+# Function to describe the model version; any change produces a new cache key.
+# The installed package version is read from metadata, so a cache hit never has to
+# import sentence-transformers or load the model.
+def model_signature(model_name):
+    try:
+        library_version = importlib.metadata.version("sentence-transformers")
+    except importlib.metadata.PackageNotFoundError:
+        library_version = "unknown"
+    return f"{model_name}|sentence-transformers={library_version}|v{EMBEDDING_FORMAT_VERSION}"
+
+# Function to describe how a document is cut into chunks; the chunks (and so their
+# embeddings) change with the sentence splitter and the parsed document layout
+def segmentation_signature():
+    return f"splitter={SENTENCE_SPLITTER}|parsed=v{PARSED_FORMAT_VERSION}"
+
+# Function to build the cache key for a document and model
+def embedding_cache_key(doc_hash, signature):
+    return hashlib.sha256(f"{doc_hash}|{signature}".encode("utf-8")).hexdigest()
+
+def _cache_paths(key):
+    return (
+        os.path.join(EMBEDDING_CACHE_DIR, f"{key}.npy"),
+        os.path.join(EMBEDDING_CACHE_DIR, f"{key}.faiss"),
+    )
+
+def _write_embeddings(path, embeddings):
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(embeddings, dtype=np.float32))
+    atomic_write(path, write)
+
+# Function to load cached embeddings (memory-mapped) and FAISS index, or None if missing
+def load_cached_index(key, expected_count):
+    embeddings_path, index_path = _cache_paths(key)
+    try:
+        embeddings = np.load(embeddings_path, mmap_mode="r")
+        index = faiss.read_index(index_path)
+    except (OSError, ValueError, RuntimeError):
+        return None
+    if embeddings.shape[0] != expected_count or index.ntotal != expected_count:
+        return None
+    for path in (embeddings_path, index_path):
+        os.utime(path)  # Mark as recently used for eviction
+    return embeddings, index
+
+# Function to write embeddings and FAISS index for a document to the disk cache
+def save_cached_index(key, embeddings, index):
+    embeddings_path, index_path = _cache_paths(key)
+    try:
+        os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+        _write_embeddings(embeddings_path, embeddings)
+        atomic_write(index_path, lambda tmp_path: faiss.write_index(index, tmp_path))
+    except (OSError, RuntimeError) as e:
+        print(f"Error: Unable to write embedding cache: {e}")
+        return
+    evict_disk_cache(EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES)
+
+# Function to get the embeddings and FAISS index of a document, computing them only once
+# per (document hash, segmentation, model version, index type). build_embeddings and
+# build_index are the callables used on a cache miss.
+def load_or_build_index(doc_hash, chunk_store, model_name, build_embeddings, build_index, index_type="flat"):
+    key = embedding_cache_key(doc_hash, f"{model_signature(model_name)}|{segmentation_signature()}|{index_type}")
+
+    with _memory_lock:
+        cached = _memory_indexes.get(key)
+        if cached is not None:
+            _memory_indexes.move_to_end(key)
+            return cached
+
+    cached = load_cached_index(key, chunk_count(chunk_store))
+    if cached is None:
+        embeddings = np.asarray(build_embeddings(chunk_store), dtype=np.float32)
+        index = build_index(embeddings)
+        save_cached_index(key, embeddings, index)
+        cached = (embeddings, index)
+
+    with _memory_lock:
+        _memory_indexes[key] = cached
+        _memory_indexes.move_to_end(key)
+        while len(_memory_indexes) > MEMORY_INDEX_ITEMS:
+            _memory_indexes.popitem(last=False)
+    return cached
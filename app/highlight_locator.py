@@ -0,0 +1,65 @@
+import numpy as np
+
+from doc_cache import columnar_words
+from instrumentation import timed
+from keyword_matcher import compile_keyword_matcher, find_keyword_hits
+
+# Keyword highlight rectangles located from the page's word boxes (the same
+# page.get_text("words") data doc_cache already stores), instead of one
+# page.search_for call per keyword. The words are joined with single spaces into one
+# string, every keyword is found in a single pass over it, and each hit is mapped back
+# to the boxes of the words it covers. Phrases that wrap onto the next line get one
+# rectangle per line, like search_for.
+
+# Function to get the columnar words (boxes, texts, (block, line, word_no) ids) of a fitz page
+def page_words_from_page(page):
+    return columnar_words(page.get_text("words"))
+
+# Function to join the words of a page and record where each word starts and ends
+def word_offsets(texts):
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    starts = np.zeros(len(texts), dtype=np.int64)
+    if len(texts) > 1:
+        starts[1:] = np.cumsum(lengths + 1)[:-1]
+    return " ".join(texts), starts, starts + lengths
+
+def _trimmed_x(box, fraction_start, fraction_end):
+    width = box[2] - box[0]
+    return box[0] + width * fraction_start, box[0] + width * fraction_end
+
+# Function to find the rectangles of every keyword on a page in one pass.
+# keywords may be a list of keywords or a matcher from compile_keyword_matcher.
+# Returns a list of (term, (x0, y0, x1, y1)); the rectangle is narrowed to the matched
+# characters when a keyword covers only part of a word.
+@timed("highlight_locate")
+def locate_keywords(page_words, keywords):
+    boxes, texts, ids = page_words
+    matcher = keywords if isinstance(keywords, dict) else compile_keyword_matcher([" ".join(keyword.split()) for keyword in keywords])
+    if not texts:
+        return []
+
+    text, starts, ends = word_offsets(texts)
+    rects = []
+    for hit_start, hit_end, term in find_keyword_hits(matcher, text):
+        first = int(np.searchsorted(ends, hit_start, side="right"))  # First word ending after the hit starts
+        last = int(np.searchsorted(starts, hit_end, side="left")) - 1  # Last word starting before the hit ends
+
+        line_rect = None
+        line_key = None
+        for word in range(first, last + 1):
+            word_length = max(int(ends[word] - starts[word]), 1)
+            fraction_start = max(hit_start - starts[word], 0) / word_length
+            fraction_end = min(hit_end - starts[word], word_length) / word_length
+            x0, x1 = _trimmed_x(boxes[word], fraction_start, fraction_end)
+            y0, y1 = boxes[word][1], boxes[word][3]
+
+            key = (ids[word][0], ids[word][1])  # (block, line)
+            if line_rect is not None and key == line_key:
+                line_rect = [min(line_rect[0], x0), min(line_rect[1], y0), max(line_rect[2], x1), max(line_rect[3], y1)]
+            else:
+                if line_rect is not None:
+                    rects.append((term, tuple(float(value) for value in line_rect)))
+                line_rect, line_key = [x0, y0, x1, y1], key
+        if line_rect is not None:
+            rects.append((term, tuple(float(value) for value in line_rect)))
+    return rects
@@ -0,0 +1,136 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from instrumentation import span, timed
+from keyword_matcher import compile_keyword_matcher, find_keyword_hits
+
+# BM25 parameters and reciprocal rank fusion settings
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+CANDIDATE_COUNT = 100  # Candidates taken from each retriever before fusion
+# Boost of a sentence containing selected catalog keywords: KEYWORD_BOOST of a top-ranked
+# hit's score per matched keyword, for at most KEYWORD_BOOST_MAX_TERMS keywords. At most
+# half a top rank, it reorders candidates of similar relevance without lifting a weak
+# candidate above one that either retriever ranks first.
+KEYWORD_BOOST = 0.25
+KEYWORD_BOOST_MAX_TERMS = 2
+
+# Tokens keep digits, so exact terms such as "Scope 3" or "PAI 14" stay searchable
+TOKEN_PATTERN = re.compile(r"\w+")
+
+MEMORY_BM25_ITEMS = 8
+_bm25_cache = OrderedDict()
+_bm25_lock = threading.Lock()
+
+# Function to split a text into lowercase word tokens
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+# Function to build a BM25 inverted index over a list of sentences.
+# Postings are stored CSR-style: the documents and term frequencies of term t are
+# doc_ids[indptr[t]:indptr[t + 1]] and term_freqs[indptr[t]:indptr[t + 1]].
+def build_bm25_index(sentences):
+    vocabulary = {}
+    term_ids = []
+    doc_ids = []
+    term_freqs = []
+    doc_lengths = np.zeros(len(sentences), dtype=np.float32)
+
+    for doc_id, sentence in enumerate(sentences):
+        tokens = tokenize(sentence)
+        doc_lengths[doc_id] = len(tokens)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+            doc_ids.append(doc_id)
+            term_freqs.append(count)
+
+    term_ids = np.array(term_ids, dtype=np.int32)
+    order = np.argsort(term_ids, kind="stable")
+    indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=indptr[1:])
+
+    doc_freqs = np.diff(indptr).astype(np.float32)
+    doc_count = len(sentences)
+    return {
+        "vocabulary": vocabulary,
+        "indptr": indptr,
+        "doc_ids": np.array(doc_ids, dtype=np.int32)[order],
+        "term_freqs": np.array(term_freqs, dtype=np.float32)[order],
+        "doc_lengths": doc_lengths,
+        "avg_doc_length": float(doc_lengths.mean()) if doc_count else 0.0,
+        "idf": np.log(1 + (doc_count - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32),
+    }
+
+# Function to get the BM25 index of a document's chunks, built once per document
+def get_bm25_index(chunk_store):
+    doc_hash = chunk_store["doc_hash"]
+    with _bm25_lock:
+        bm25 = _bm25_cache.get(doc_hash)
+        if bm25 is not None:
+            _bm25_cache.move_to_end(doc_hash)
+            return bm25
+
+    bm25 = build_bm25_index(chunk_store["sentences"])
+    with _bm25_lock:
+        _bm25_cache[doc_hash] = bm25
+        while len(_bm25_cache) > MEMORY_BM25_ITEMS:
+            _bm25_cache.popitem(last=False)
+    return bm25
+
+# Function to score every sentence against a query with BM25
+@timed("bm25")
+def bm25_scores(bm25, query):
+    scores = np.zeros(len(bm25["doc_lengths"]), dtype=np.float32)
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * bm25["doc_lengths"] / max(bm25["avg_doc_length"], 1e-6))
+    for token in set(tokenize(query)):
+        term_id = bm25["vocabulary"].get(token)
+        if term_id is None:
+            continue
+        start, end = bm25["indptr"][term_id], bm25["indptr"][term_id + 1]
+        docs = bm25["doc_ids"][start:end]
+        tf = bm25["term_freqs"][start:end]
+        scores[docs] += bm25["idf"][term_id] * tf * (BM25_K1 + 1) / (tf + length_norm[docs])
+    return scores
+
+# Function to rank sentences for many queries by fusing dense inner-product search and
+# BM25 with reciprocal rank fusion. Sentences containing any of the given catalog keywords
+# get a small boost (see KEYWORD_BOOST). Returns, per query, a list of (chunk index, fused score).
+def hybrid_search(queries, query_embeddings, chunk_store, index, k=5, boost_keywords=()):
+    bm25 = get_bm25_index(chunk_store)
+    sentences = chunk_store["sentences"]
+    candidate_count = min(max(CANDIDATE_COUNT, k), index.ntotal)
+    with span("faiss_search"):
+        _, dense_indices = index.search(np.asarray(query_embeddings, dtype=np.float32), candidate_count)
+    matcher = compile_keyword_matcher(boost_keywords) if boost_keywords else None
+
+    results = []
+    for row, query in enumerate(queries):
+        fused = {}
+        for rank, chunk_index in enumerate(dense_indices[row]):
+            if chunk_index >= 0:
+                fused[int(chunk_index)] = fused.get(int(chunk_index), 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        sparse = bm25_scores(bm25, query)
+        sparse_candidates = np.flatnonzero(sparse)
+        if len(sparse_candidates) > candidate_count:
+            top = np.argpartition(-sparse[sparse_candidates], candidate_count)[:candidate_count]
+            sparse_candidates = sparse_candidates[top]
+        sparse_candidates = sparse_candidates[np.argsort(-sparse[sparse_candidates], kind="stable")]
+        for rank, chunk_index in enumerate(sparse_candidates.tolist()):
+            fused[chunk_index] = fused.get(chunk_index, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+        if matcher is not None:
+            for chunk_index in fused:
+                matched_terms = {term for _, _, term in find_keyword_hits(matcher, sentences[chunk_index])}
+                fused[chunk_index] += KEYWORD_BOOST * min(len(matched_terms), KEYWORD_BOOST_MAX_TERMS) / (RRF_K + 1)
+
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+        results.append(ranked)
+    return results
@@ -0,0 +1,166 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+# Lightweight timing spans for the hot paths (text extraction, sentence tokenization,
+# keyword matching, encoding, FAISS search, rendering). Each span adds its duration and
+# the growth of the process' peak memory to a per-stage total:
+#   - for the current run (one Streamlit script run, or one batch document), shown in the
+#     sidebar timing panel and appended to EXTRACTOR_METRICS_JSONL if set
+#   - for the whole process, exported as Prometheus text (written to EXTRACTOR_METRICS_PROM
+#     if set, e.g. for the node_exporter textfile collector)
+# Work done inside parse worker processes is only visible as the parent's waiting time.
+METRICS_ENABLED = os.environ.get("EXTRACTOR_METRICS", "1") != "0"
+METRICS_JSONL_PATH = os.environ.get("EXTRACTOR_METRICS_JSONL")
+METRICS_PROM_PATH = os.environ.get("EXTRACTOR_METRICS_PROM")
+
+_current_run = contextvars.ContextVar("instrumentation_run", default=None)
+_process_totals = {}
+_process_lock = threading.Lock()
+
+# Function to read the peak resident memory of the process in bytes (None if unknown)
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+def _add(totals, stage, seconds, memory_growth):
+    stats = totals.get(stage)
+    if stats is None:
+        stats = totals[stage] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "peak_rss_growth": 0}
+    stats["calls"] += 1
+    stats["seconds"] += seconds
+    stats["max_seconds"] = max(stats["max_seconds"], seconds)
+    stats["peak_rss_growth"] += memory_growth
+
+# Function to time a block of code as one call of the given stage
+@contextlib.contextmanager
+def span(stage):
+    if not METRICS_ENABLED:
+        yield
+        return
+    peak_before = peak_rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        memory_growth = (peak_rss_bytes() - peak_before) if peak_before is not None else 0
+        run = _current_run.get()
+        if run is not None:
+            with run["lock"]:
+                _add(run["stages"], stage, seconds, memory_growth)
+        with _process_lock:
+            _add(_process_totals, stage, seconds, memory_growth)
+
+# Decorator form of span
+def timed(stage):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Function to start recording a run in the current thread; spans of this thread (and
+# of threads started with a copy of its context) are attributed to it
+def start_run(name):
+    run = {"name": name, "started": time.time(), "start": time.perf_counter(), "stages": {}, "lock": threading.Lock()}
+    _current_run.set(run)
+    return run
+
+# Function to close a run: returns its summary and writes the configured exports
+def finish_run(run):
+    _current_run.set(None)
+    with run["lock"]:
+        stages = {stage: dict(stats) for stage, stats in run["stages"].items()}
+    summary = {
+        "name": run["name"],
+        "timestamp": run["started"],
+        "wall_seconds": time.perf_counter() - run["start"],
+        "peak_rss_bytes": peak_rss_bytes(),
+        "stages": stages,
+    }
+    try:
+        if METRICS_JSONL_PATH:
+            with open(METRICS_JSONL_PATH, "a", encoding="utf-8") as f:
+                f.write(to_json_lines(summary))
+        if METRICS_PROM_PATH:
+            tmp_path = METRICS_PROM_PATH + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(prometheus_text())
+            os.replace(tmp_path, METRICS_PROM_PATH)
+    except OSError as e:
+        print(f"Error: Unable to write metrics: {e}")
+    return summary
+
+# Function to format a run summary as JSON lines, one line per stage
+def to_json_lines(summary):
+    lines = []
+    for stage, stats in sorted(summary["stages"].items()):
+        lines.append(json.dumps({
+            "run": summary["name"],
+            "timestamp": summary["timestamp"],
+            "stage": stage,
+            **stats,
+            "run_wall_seconds": summary["wall_seconds"],
+            "peak_rss_bytes": summary["peak_rss_bytes"],
+        }))
+    return "".join(line + "\n" for line in lines)
+
+# Function to format the process-wide stage totals in the Prometheus text format
+def prometheus_text():
+    with _process_lock:
+        totals = {stage: dict(stats) for stage, stats in _process_totals.items()}
+
+    metrics = [
+        ("extractor_stage_calls_total", "counter", "Number of calls of each instrumented stage", "calls"),
+        ("extractor_stage_seconds_total", "counter", "Time spent in each instrumented stage", "seconds"),
+        ("extractor_stage_max_seconds", "gauge", "Longest single call of each instrumented stage", "max_seconds"),
+        ("extractor_stage_peak_rss_growth_bytes_total", "counter", "Growth of the peak resident memory during each stage", "peak_rss_growth"),
+    ]
+    lines = []
+    for metric, metric_type, help_text, field in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for stage, stats in sorted(totals.items()):
+            lines.append(f'{metric}{{stage="{stage}"}} {stats[field]}')
+    peak = peak_rss_bytes()
+    if peak is not None:
+        lines.append("# HELP extractor_process_peak_rss_bytes Peak resident memory of the process")
+        lines.append("# TYPE extractor_process_peak_rss_bytes gauge")
+        lines.append(f"extractor_process_peak_rss_bytes {peak}")
+    return "\n".join(lines) + "\n"
+
+# Function to show the stage timings of the last run in the Streamlit sidebar
+def display_timing_panel(summary):
+    import pandas as pd
+    import streamlit as st
+
+    st.sidebar.markdown("### Timings (last run)")
+    if not summary or not summary["stages"]:
+        st.sidebar.write("Nothing measured yet.")
+        return
+
+    rows = [
+        [stage, stats["calls"], stats["seconds"] * 1000, stats["max_seconds"] * 1000, stats["peak_rss_growth"] / 1024 ** 2]
+        for stage, stats in summary["stages"].items()
+    ]
+    frame = pd.DataFrame(rows, columns=["Stage", "Calls", "Total ms", "Max ms", "Peak RSS +MB"])
+    st.sidebar.dataframe(frame.sort_values("Total ms", ascending=False).round(1), hide_index=True)
+    peak = summary["peak_rss_bytes"]
+    st.sidebar.caption(f"Run took {summary['wall_seconds']:.2f} s" + (f", peak memory {peak / 1024 ** 2:.0f} MB" if peak else ""))
+    st.sidebar.download_button("Metrics (JSON lines)", to_json_lines(summary), file_name="metrics.jsonl", mime="application/json")
+    st.sidebar.download_button("Metrics (Prometheus)", prometheus_text(), file_name="metrics.prom", mime="text/plain")
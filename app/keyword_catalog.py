@@ -0,0 +1,292 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from io import BytesIO
+
+import numpy as np
+import pandas as pd  # For handling Excel conversion
+
+from doc_cache import CACHE_ROOT, atomic_write
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The keyword sheets of every team: where to download them, the local copy to fall back
+# on when there is no network, and the column holding the indicator. Teams without a
+# local copy are only available once their sheet has been downloaded.
+TEAM_SOURCES = [
+    {
+        "team": "sfdr",
+        "indicator_column": "SFDR Indicator",
+        "url": "https://raw.github.com/Dheena1-coder/PdfAnalyzer/master/sfdr_file.xlsx",
+        "local_path": None,
+    },
+    {
+        "team": "physical assets",
+        "indicator_column": "Asset/Report Type",
+        "url": "https://raw.github.com/Dheena1-coder/PdfAnalyzer/master/asset_file.xlsx",
+        "local_path": None,
+    },
+    {
+        "team": "Company data - Granular segments",
+        "indicator_column": "Granular Indicator",
+        "url": "https://raw.github.com/Dheena1-coder/key_or_query/main/gowtham_keywords.xlsx",
+        "local_path": os.path.join(REPO_ROOT, "gowtham_keywords.xlsx"),
+    },
+    {
+        "team": "ENS Diversity",
+        "indicator_column": "Div_Indicators",
+        "url": "https://raw.github.com/Dheena1-coder/key_or_query/main/Diversity_Keywords.xlsx",
+        "local_path": os.path.join(REPO_ROOT, "Diversity_Keywords.xlsx"),
+    },
+    {
+        "team": "Governance annual update",
+        "indicator_column": "CG- Indicator",
+        "url": "https://raw.github.com/Dheena1-coder/key_or_query/main/Governance_update_keywords.xlsx",
+        "local_path": os.path.join(REPO_ROOT, "Governance_update_keywords.xlsx"),
+    },
+]
+
+TEAM_NAMES = [source["team"] for source in TEAM_SOURCES]
+
+# Compiled catalog snapshot and refresh settings (override with environment variables)
+CATALOG_SNAPSHOT_PATH = os.environ.get("EXTRACTOR_CATALOG_SNAPSHOT", os.path.join(CACHE_ROOT, "keyword_catalog.json"))
+CATALOG_REFRESH_SECONDS = int(os.environ.get("EXTRACTOR_CATALOG_REFRESH_SECONDS", "900"))
+DOWNLOAD_TIMEOUT_SECONDS = 20
+
+# Bump when the compiled layout changes so old snapshots are rebuilt
+CATALOG_FORMAT_VERSION = 3
+
+_catalog = None
+_catalog_lock = threading.Lock()
+_refresher_started = False
+
+# Load the SFDR and Asset Keyword data from GitHub (URLs directly)
+def load_keywords_from_github(url):
+    # Load the Excel file directly from GitHub
+    df = pd.read_excel(url, engine='openpyxl')
+    return df
+
+# Function to turn a team sheet into one row per (indicator, datapoint, keyword).
+# Rows keep the sheet order and duplicate keywords of a datapoint keep their first position.
+def explode_keywords(df, team_type):
+    indicator_column = next(source["indicator_column"] for source in TEAM_SOURCES if source["team"] == team_type)
+    frame = df[[indicator_column, 'Datapoint Name', 'Keywords']]
+    frame.columns = ["indicator", "datapoint", "keyword"]
+
+    # Skip rows without a valid indicator or datapoint
+    frame = frame.dropna(subset=["indicator", "datapoint"])
+    frame = frame.astype({"indicator": str, "datapoint": str})
+    frame = frame[frame["indicator"].str.strip() != ""]
+
+    frame = frame.assign(keyword=frame["keyword"].fillna("").astype(str).str.split(","))
+    frame = frame.explode("keyword", ignore_index=True)
+    frame["keyword"] = frame["keyword"].str.strip()
+    frame = frame[frame["keyword"] != ""]
+    return frame.drop_duplicates(["indicator", "datapoint", "keyword"])
+
+# Process data into dictionary
+def process_keywords_to_dict(df, team_type):
+    return keywords_frame_to_dict(explode_keywords(df, team_type))
+
+# Function to group the values of a frame by some key columns, keeping first-seen order of
+# both the groups and the values. Returns (group keys, list of values per group).
+def grouped_lists(frame, key_columns, values):
+    if len(key_columns) == 1:
+        codes, uniques = pd.factorize(frame[key_columns[0]])
+    else:
+        codes, uniques = pd.MultiIndex.from_frame(frame[key_columns]).factorize()
+    value_array = np.empty(len(codes), dtype=object)
+    value_array[:] = list(values)
+
+    order = np.argsort(codes, kind="stable")
+    boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+    groups = np.split(value_array[order], boundaries) if len(order) else []
+    return list(uniques), [group.tolist() for group in groups]
+
+# Function to build {indicator: {datapoint: [keywords]}} from the exploded keyword rows
+def keywords_frame_to_dict(frame):
+    keyword_dict = {}
+    group_keys, keyword_lists = grouped_lists(frame, ["indicator", "datapoint"], frame["keyword"])
+    for (indicator, datapoint), keywords in zip(group_keys, keyword_lists):
+        keyword_dict.setdefault(indicator, {})[datapoint] = keywords
+    return keyword_dict
+
+# Function to build the reverse index {lowercase keyword: [[indicator, datapoint], ...]}
+# used to map matcher hits back to the datapoints they belong to
+def keywords_frame_to_reverse_index(frame):
+    frame = frame.assign(term=frame["keyword"].str.lower())
+    frame = frame.drop_duplicates(["term", "indicator", "datapoint"])
+    pairs = list(zip(frame["indicator"], frame["datapoint"]))
+    terms, pair_lists = grouped_lists(frame, ["term"], pairs)
+    return {term: [list(pair) for pair in pair_list] for term, pair_list in zip(terms, pair_lists)}
+
+# Function to download a sheet, returning (content, etag); content is None when the
+# server reports the sheet is unchanged since the given etag
+def download_source(url, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+            return response.read(), response.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, etag
+        raise
+
+# Function to compile one team sheet (Excel bytes or path) into its keyword dictionary
+# and reverse index
+def compile_team_sheet(excel_source, team):
+    if isinstance(excel_source, bytes):
+        excel_source = BytesIO(excel_source)
+    frame = explode_keywords(load_keywords_from_github(excel_source), team)
+    return keywords_frame_to_dict(frame), keywords_frame_to_reverse_index(frame)
+
+# Function to refresh one team in the catalog if its sheet changed.
+# The remote sheet is checked first (conditional GET on the ETag); without network the
+# local copy is used when its modification time changed, but only for a team that is
+# missing or was itself built from the local copy: a failed download never replaces a
+# downloaded sheet with the bundled one. Returns True if updated.
+def refresh_team(catalog, source, allow_network=True):
+    team = source["team"]
+    state = catalog["sources"].setdefault(team, {})
+
+    if allow_network and source["url"]:
+        try:
+            content, etag = download_source(source["url"], state.get("etag"))
+            if content is None and team in catalog["teams"]:
+                return False
+            if content is not None:
+                catalog["teams"][team], catalog["reverse_index"][team] = compile_team_sheet(content, team)
+                state["origin"] = "remote"
+                state["etag"] = etag
+                state["updated_at"] = time.time()
+                return True
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            print(f"Error: Unable to download keywords for {team}: {e}")
+
+    local_path = source["local_path"]
+    if local_path and os.path.exists(local_path):
+        if team in catalog["teams"] and state.get("origin") != "local":
+            return False
+        mtime = os.path.getmtime(local_path)
+        if team in catalog["teams"] and state.get("mtime") == mtime:
+            return False
+        catalog["teams"][team], catalog["reverse_index"][team] = compile_team_sheet(local_path, team)
+        state["origin"] = "local"
+        state["mtime"] = mtime
+        state["updated_at"] = time.time()
+        # The ETag belonged to the replaced content; without it the next download fetches
+        # the remote sheet instead of getting "304 Not Modified"
+        state.pop("etag", None)
+        return True
+
+    return False
+
+# Function to read the compiled catalog snapshot, or None if it is missing or outdated
+def load_catalog_snapshot(path=CATALOG_SNAPSHOT_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if catalog.get("format_version") != CATALOG_FORMAT_VERSION:
+        return None
+    return catalog
+
+# Function to write the compiled catalog snapshot atomically
+def save_catalog_snapshot(catalog, path=CATALOG_SNAPSHOT_PATH):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, ensure_ascii=False, separators=(",", ":"))
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, write)
+    except OSError as e:
+        print(f"Error: Unable to write keyword catalog snapshot: {e}")
+
+# Function to check every team sheet once and swap in the updated catalog
+def refresh_catalog(allow_network=True):
+    global _catalog
+    with _catalog_lock:
+        current = _catalog or {"format_version": CATALOG_FORMAT_VERSION, "teams": {}, "reverse_index": {}, "sources": {}}
+    # Work on a copy so readers keep a consistent catalog while sheets are compiled
+    catalog = json.loads(json.dumps(current))
+
+    changed = False
+    for source in TEAM_SOURCES:
+        try:
+            changed = refresh_team(catalog, source, allow_network) or changed
+        except Exception as e:
+            print(f"Error: Unable to compile keywords for {source['team']}: {e}")
+
+    if changed:
+        with _catalog_lock:
+            _catalog = catalog
+        save_catalog_snapshot(catalog)
+    return changed
+
+def _refresh_loop():
+    while True:
+        refresh_catalog()
+        time.sleep(CATALOG_REFRESH_SECONDS)
+
+# Function to start the background thread that keeps the catalog up to date
+def start_catalog_refresher():
+    global _refresher_started
+    with _catalog_lock:
+        if _refresher_started or CATALOG_REFRESH_SECONDS <= 0:
+            return
+        _refresher_started = True
+    threading.Thread(target=_refresh_loop, name="keyword-catalog-refresh", daemon=True).start()
+
+# Function to get the current compiled catalog. It is loaded from the local snapshot (or
+# built from the local sheets on first start) without touching the network; remote
+# sheets are refreshed in the background. The catalog lives at module level, so every
+# Streamlit session shares it.
+def load_compiled_catalog():
+    global _catalog
+    with _catalog_lock:
+        catalog = _catalog
+    if catalog is None:
+        snapshot = load_catalog_snapshot()
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = snapshot
+        if snapshot is None:
+            refresh_catalog(allow_network=False)
+        start_catalog_refresher()
+        with _catalog_lock:
+            catalog = _catalog
+    return catalog
+
+# Function to get the keyword catalog {team: {indicator: {datapoint: [keywords]}}}
+def get_keyword_catalog():
+    catalog = load_compiled_catalog()
+    return catalog["teams"] if catalog else {}
+
+# Function to get the reverse index {lowercase keyword: [[indicator, datapoint], ...]} of a team
+def get_reverse_index(team):
+    catalog = load_compiled_catalog()
+    return catalog["reverse_index"].get(team, {}) if catalog else {}
+
+# Function to explain why a team has no keywords in the catalog
+def missing_team_message(team):
+    if team not in TEAM_NAMES:
+        return f"Unknown team '{team}'. Available teams: {', '.join(TEAM_NAMES)}"
+    return (f"The keywords of '{team}' are not available yet. This team has no bundled sheet, so its "
+            "keywords must first be downloaded from GitHub, which happens in the background when "
+            "there is a network connection. Please try again later.")
+
+# Function to collect the keywords of the selected datapoints, without duplicates
+def keywords_for_datapoints(catalog, team, indicator, datapoint_names):
+    selected_keywords = []
+    datapoints = catalog.get(team, {}).get(indicator, {})
+    for datapoint in datapoint_names:
+        for keyword in datapoints.get(datapoint, []):
+            if keyword not in selected_keywords:
+                selected_keywords.append(keyword)
+    return selected_keywords
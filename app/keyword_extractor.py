@@ -1,187 +1,249 @@
-import fitz  # PyMuPDF
-import spacy
-import re
 import streamlit as st
-import pandas as pd  # For handling Excel conversion
-import os
 import time
-from io import BytesIO
-from PIL import Image, ImageEnhance  # Import Pillow for image processing
-import tempfile
 import urllib.request
 import zipfile
-import nltk
-from nltk.tokenize import word_tokenize, sent_tokenize
-nltk.download('punkt_tab')
+from doc_cache import iter_parsed_pages, load_parsed_document, page_sentence_spans, page_sentences, record_sentence_spans
+from page_renderer import FULL_DPI, FULL_FORMAT, THUMBNAIL_DPI, THUMBNAIL_FORMAT, get_page_image
+from coverage_scan import coverage_counts_frame, coverage_frame, coverage_matrix_frame, scan_coverage
+from keyword_catalog import TEAM_NAMES, get_keyword_catalog, keywords_for_datapoints, missing_team_message
+from keyword_matcher import compile_keyword_matcher, find_keyword_hits, highlight_spans, hits_by_sentence, match_page_sentences
+from keyword_stats import add_page_counts, counts_frame, new_keyword_stats, page_keyword_counts, stats_frame, stats_from_keyword_results
+from workspace import open_uploaded_pdf
+
+# Minimum time between two refreshes of the live statistics table while streaming
+STREAM_UPDATE_SECONDS = 0.5
+
 # Function to extract keyword information and surrounding context from PDF
 def extract_keyword_info(pdf_path, keywords, surrounding_sentences_count=2):
-    keywords = [keyword.lower() for keyword in keywords]  # Convert keywords to lowercase
+    matcher = compile_keyword_matcher(keywords)
     extracted_data = {}
 
-    doc = fitz.open(pdf_path)
-
-    if len(doc) == 0:
-        raise ValueError("The uploaded PDF has no pages.")
-    
-    for page_number in range(len(doc)):
-        page = doc.load_page(page_number)
-        text = page.get_text()
-
-        if text:
-            sentences = sent_tokenize(text)
-
-            matching_sentences = []
-            for idx, sentence in enumerate(sentences):
-                if any(keyword in sentence.lower() for keyword in keywords):
-                    start_idx = max(0, idx - surrounding_sentences_count)
-                    end_idx = min(len(sentences), idx + surrounding_sentences_count + 1)
-                    surrounding = sentences[start_idx:end_idx]
-                    highlighted_sentence = highlight_keywords(sentence, keywords)
-                    matching_sentences.append({
-                        "sentence": highlighted_sentence,
-                        "surrounding_context": surrounding,
-                        "page_number": page_number + 1
-                    })
-
-            if matching_sentences:
-                extracted_data[page_number + 1] = matching_sentences
+    for page_number, sentences, sentence_hits in iter_page_sentences(pdf_path, matcher):
+        matching_sentences = []
+        for idx, sentence in enumerate(sentences):
+            hits = sentence_hits.get(idx)
+            if hits:
+                start_idx = max(0, idx - surrounding_sentences_count)
+                end_idx = min(len(sentences), idx + surrounding_sentences_count + 1)
+                surrounding = sentences[start_idx:end_idx]
+                highlighted_sentence = highlight_spans(sentence, [(start, end) for start, end, _ in hits])
+                matching_sentences.append({
+                    "sentence": highlighted_sentence,
+                    "surrounding_context": surrounding,
+                    "page_number": page_number
+                })
+
+        if matching_sentences:
+            extracted_data[page_number] = matching_sentences
 
     return extracted_data
 
-def highlight_keywords(text, keywords):
-    for keyword in keywords:
-        text = re.sub(f'({re.escape(keyword)})', r'<b style="color: red;">\1</b>', text, flags=re.IGNORECASE)
-    return text
-# Function to highlight keywords on a PDF page
-def highlight_pdf_page(pdf_path, page_number, keywords):
-    """Highlight keywords in the PDF page using rectangles"""
-    doc = fitz.open(pdf_path)
-    page = doc.load_page(page_number - 1)  # Page numbers are 1-based, so adjust for 0-based indexing
-
-    # Loop through each keyword to find and highlight occurrences
-    for keyword in keywords:
-        text_instances = page.search_for(keyword)  # Find the keyword locations in the text
-
-        for inst in text_instances:
-            # Create a rectangle based on the text instance
-            rect = fitz.Rect(inst)
-            # Draw a neon green rectangle around the keyword (no fill)
-            page.draw_rect(rect, color=(0, 1, 0))
-
-    # Save the updated PDF with a unique name based on the timestamp
-    timestamp = int(time.time())  # Get current timestamp
-    highlighted_pdf_path = f"temp_highlighted_page_{timestamp}.pdf"
-    # Check if the file already exists and try to delete it
-    if os.path.exists(highlighted_pdf_path):
-        try:
-            os.remove(highlighted_pdf_path)  # Try to remove the file if it exists
-        except PermissionError as e:
-            print(f"Error: Unable to delete {highlighted_pdf_path}. {e}")
-
-    # Save the file with a unique name
-    try:
-        doc.save(highlighted_pdf_path)
-        print(f"Highlighted PDF saved to: {highlighted_pdf_path}")
-    except Exception as e:
-        print(f"Error: Unable to save PDF: {e}")
-
-    return highlighted_pdf_path
-# Load the SFDR and Asset Keyword data from GitHub (URLs directly)
-def load_keywords_from_github(url):
-    # Load the Excel file directly from GitHub
-    df = pd.read_excel(url, engine='openpyxl')  
-    return df
-# Process data into dictionary
-def process_keywords_to_dict(df, team_type):
-    keyword_dict = {}
-    for index, row in df.iterrows():
-        indicator = None
-        if team_type == 'sfdr':
-            indicator = row['SFDR Indicator']  
-        elif team_type == 'physical assets': 
-            indicator = row['Asset/Report Type']
-        elif team_type == 'Company data - Granular segments': 
-            indicator = row['Granular Indicator']
-        elif team_type == 'ENS Diversity': 
-            indicator = row['Div_Indicators'] 
-        elif team_type == 'Governance annual update': 
-            indicator = row['CG- Indicator']
-        # Check if the indicator is valid (not None or empty)
-        if not indicator:
-            continue  # Skip this row if indicator is invalid            
-        datapoint_name = row['Datapoint Name']
-        keywords = row['Keywords'].split(',')
-        keywords = [keyword.strip() for keyword in keywords]
-
-        if indicator not in keyword_dict:
-            keyword_dict[indicator] = {}
-
-        if datapoint_name not in keyword_dict[indicator]:
-            keyword_dict[indicator][datapoint_name] = []
-
-        keyword_dict[indicator][datapoint_name].extend(keywords)
-
-    # Optional: Remove duplicates within each list of keywords for each Datapoint Name
-    for indicator in keyword_dict:
-        for datapoint in keyword_dict[indicator]:
-            keyword_dict[indicator][datapoint] = list(set(keyword_dict[indicator][datapoint]))
-
-    return keyword_dict
-# Function to display keyword stats in a table
-def display_keyword_stats(filtered_results, keywords):
-    stats_data = []
-
-    for keyword in keywords:
-        pages_found = []  # List of pages where the keyword appears
-        total_occurrences = 0  # Total occurrences of the keyword
+# Function to extract the matches of every keyword in a single pass over the PDF
+# Returns {keyword: {page: [match, ...]}}, the same per-page form as extract_keyword_info
+def extract_keyword_matches(pdf_path, keywords, surrounding_sentences_count=2, whole_words=False):
+    keyword_results = {keyword: {} for keyword in keywords}
+
+    for page_number, _, page_matches in iter_page_matches(pdf_path, keywords, surrounding_sentences_count, whole_words):
+        for keyword, matches in page_matches.items():
+            keyword_results[keyword][page_number] = matches
+
+    return keyword_results
+
+# Function to scan a PDF page by page, yielding (page number, page count, {keyword: [match, ...]})
+# as soon as each page is done. On a cache miss pages come straight from the parser, so
+# the first matches are available long before the whole document is parsed.
+# Each page's text is scanned once: pages without a hit are not split into sentences, and
+# the hits of the others are assigned to their sentences without scanning them again.
+def iter_page_matches(pdf_path, keywords, surrounding_sentences_count=2, whole_words=False):
+    matcher = compile_keyword_matcher(keywords, whole_words=whole_words)
+    page_count = 0
+
+    for page_index, page_count, page in iter_parsed_pages(pdf_path):
+        text = page["page_texts"]
+        hits = find_keyword_hits(matcher, text)
+        if not hits:
+            yield page_index + 1, page_count, {}
+            continue
+        spans = record_sentence_spans(page)
+        sentences = [text[start:end] for start, end in spans]
+        yield page_index + 1, page_count, match_page_sentences(matcher, sentences, page_index + 1, surrounding_sentences_count,
+                                                               page["sentence_boxes"], hits_by_sentence(hits, spans))
+
+    if page_count == 0:
+        raise ValueError("The uploaded PDF has no pages.")
 
-        # Iterate over the filtered results (which contains sentences with surrounding context)
-        for page, matches in filtered_results.items():
-            page_occurrences = 0  # Track occurrences on this page
-            for match in matches:
-                # Count the occurrences of the keyword in the sentence
-                occurrences_in_sentence = match['sentence'].lower().count(keyword.lower())
-                page_occurrences += occurrences_in_sentence  # Add to page's total occurrences
+# Function to yield (page number, sentences, sentence hits) for every page that has text
+# (page numbers are 1-based). The PDF is parsed once per content hash; later calls reuse
+# the cached sentences. With a matcher, each page's text is scanned once: pages without
+# any of its keywords are skipped before tokenization, and the hits are split by sentence
+# ({sentence index: hits}, see hits_by_sentence). Without a matcher the hits are None.
+def iter_page_sentences(pdf_path, matcher=None):
+    parsed = load_parsed_document(pdf_path)
 
-            # If the keyword was found on this page, add it to the pages_found list
-            if page_occurrences > 0:
-                pages_found.append(page)
-                total_occurrences += page_occurrences  # Add to total occurrences
+    if parsed["page_count"] == 0:
+        raise ValueError("The uploaded PDF has no pages.")
 
-        stats_data.append([keyword, total_occurrences, pages_found])  # Store the total occurrences and pages
+    for page_index in range(parsed["page_count"]):
+        text = parsed["page_texts"][page_index]
+        if not text:
+            continue
+        if matcher is None:
+            yield page_index + 1, page_sentences(parsed, page_index), None
+            continue
+        hits = find_keyword_hits(matcher, text)
+        if hits:
+            yield page_index + 1, page_sentences(parsed, page_index), hits_by_sentence(hits, page_sentence_spans(parsed, page_index))
 
-    stats_df = pd.DataFrame(stats_data, columns=["Keyword", "Occurrences", "Pages"])
+# Function to display keyword stats in a table
+def display_keyword_stats(keyword_results, keywords, stats=None):
     st.write("### Keyword Statistics")
-    st.dataframe(stats_df)
-
+    if stats is None:
+        stats = stats_from_keyword_results(keyword_results, keywords)
+    st.dataframe(stats_frame(stats))
+    st.download_button("Download counts per page (CSV)", counts_frame(stats).to_csv(index=False),
+                       file_name="keyword_page_counts.csv", mime="text/csv")
 
+# Function to count the occurrences and pages of every keyword in the matches found so far
+# ({keyword: {page: [match, ...]}}), from the keyword offsets stored with each match
+def keyword_stats_frame(keyword_results, keywords):
+    return stats_frame(stats_from_keyword_results(keyword_results, keywords))
 
 # Function to display PDF pages and highlight the keyword occurrences
-def display_pdf_pages(pdf_path, pages_with_matches, keywords):
-    doc = fitz.open(pdf_path)
-
+# Pages are rendered as low-DPI thumbnails; full resolution is rendered on request
+def display_pdf_pages(doc, doc_hash, pages_with_matches, keywords, dpi=THUMBNAIL_DPI, image_format=THUMBNAIL_FORMAT):
     images = {}
 
-    for i in range(len(doc)):
-        if i + 1 in pages_with_matches:
-            highlighted_pdf = highlight_pdf_page(pdf_path, i + 1, keywords)
+    # Only the matched pages are copied, highlighted and rasterized, all in memory
+    for page_number in sorted(pages_with_matches):
+        images[page_number] = get_page_image(doc, doc_hash, page_number, keywords, dpi, image_format)
 
-            doc_highlighted = fitz.open(highlighted_pdf)
-            page_highlighted = doc_highlighted.load_page(i)
-
-            pix = page_highlighted.get_pixmap(dpi=300)
-            pil_image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-            enhancer = ImageEnhance.Contrast(pil_image)
-            pil_image = enhancer.enhance(1.5)
+    return images
 
-            img_byte_arr = BytesIO()
-            pil_image.save(img_byte_arr, format="PNG")
-            img_byte_arr.seek(0)
+# Function to show the page image and matched sentences of one keyword on one page.
+# The full resolution checkbox is left out while streaming, as clicking it reruns the script.
+def display_page_matches(doc, doc_hash, keyword, page, match_list, keywords, thumbnail=None, allow_full_page=True):
+    st.markdown(f"### **Page {page}:**")
+
+    # Display the image of the page, at full resolution only once requested
+    if allow_full_page and st.checkbox("Show full resolution page", key=f"full_page_{keyword}_{page}"):
+        full_image = get_page_image(doc, doc_hash, page, keywords, FULL_DPI, FULL_FORMAT)
+        st.image(full_image, caption=f"Page {page}", use_column_width=True)
+    elif thumbnail is not None:
+        st.image(thumbnail, caption=f"Page {page}")
+
+    for match in match_list:
+        st.markdown(f"#### **Matched Sentence on Page {match['page_number']}:**")
+        st.markdown(f"<p style='color: #00C0F9;'>{match['sentence']}</p>", unsafe_allow_html=True)
+        st.write("**Context**: ")
+        for context_sentence in match['surrounding_context']:
+            st.write(f"  - {context_sentence}")
+
+# Function to merge the per-keyword results into {page: [match, ...]}
+def matches_by_page(keyword_results):
+    filtered_results = {}
+    for keyword, matches in keyword_results.items():
+        for page, match_list in matches.items():
+            if page not in filtered_results:
+                filtered_results[page] = []
+            filtered_results[page].extend(match_list)
+    return filtered_results
+
+# Function to run the extraction page by page, updating the stats table, the progress bar
+# and the result expanders as pages come in. The extraction dict lives in the session
+# state and is filled in place, so a cancelled scan keeps the results found so far.
+def stream_extraction(doc, pdf_bytes, extraction, surrounding_sentences_count):
+    keyword_results = extraction["keyword_results"]
+    selected_keywords = extraction["keywords"]
+    stats = extraction["keyword_stats"] = new_keyword_stats(selected_keywords)
+
+    progress_bar = st.progress(0.0, text="Scanning the document...")
+    st.button("Cancel")  # Any click reruns the script, which stops this scan
+    st.write("### Keyword Statistics")
+    stats_placeholder = st.empty()
+    expanders = {keyword: st.expander(f"Results for '{keyword}'") for keyword in keyword_results}
+
+    last_update = 0.0
+    for page_number, page_count, page_matches in iter_page_matches(pdf_bytes, selected_keywords, surrounding_sentences_count):
+        if page_matches:
+            thumbnail = get_page_image(doc, extraction["doc_hash"], page_number, selected_keywords, THUMBNAIL_DPI, THUMBNAIL_FORMAT)
+            add_page_counts(stats, page_number, page_keyword_counts(page_matches))
+            for keyword, match_list in page_matches.items():
+                keyword_results[keyword][page_number] = match_list
+                with expanders[keyword]:
+                    display_page_matches(doc, extraction["doc_hash"], keyword, page_number, match_list, selected_keywords, thumbnail, allow_full_page=False)
+        extraction["pages_scanned"] = page_number
+        extraction["page_count"] = page_count
+
+        now = time.monotonic()
+        if page_number == page_count or now - last_update >= STREAM_UPDATE_SECONDS:
+            progress_bar.progress(page_number / page_count, text=f"Scanned page {page_number} of {page_count}")
+            stats_placeholder.dataframe(stats_frame(stats))
+            last_update = now
+
+    extraction["complete"] = True
+
+# Function to show the stats, page images and matched sentences of an extraction
+def display_extraction_results(doc, extraction):
+    keyword_results = extraction["keyword_results"]
+    selected_keywords = extraction["keywords"]
+
+    if not extraction.get("complete", True):
+        st.info(f"Extraction cancelled after page {extraction['pages_scanned']} of {extraction['page_count']}. Showing the matches found so far.")
+
+    filtered_results = matches_by_page(keyword_results)
+
+    # Display keyword stats
+    display_keyword_stats(keyword_results, selected_keywords, extraction.get("keyword_stats"))
+
+    # Display results for matched pages and keywords
+    if filtered_results:
+        page_images = display_pdf_pages(doc, extraction["doc_hash"], filtered_results.keys(), selected_keywords)
+        for keyword, matches in keyword_results.items():
+            with st.expander(f"Results for '{keyword}'"):
+                for page, match_list in sorted(matches.items()):
+                    display_page_matches(doc, extraction["doc_hash"], keyword, page, match_list, selected_keywords, page_images.get(page))
 
-            images[i + 1] = img_byte_arr
-    
-    return images
+    else:
+        st.warning("No matches found for the selected keywords.")
+
+# Function to show the result of a coverage scan: which datapoints were found, the
+# datapoint x page hit matrix and the best evidence sentences of each datapoint
+def display_coverage(coverage):
+    table = coverage_frame(coverage)
+    found = int((table["Hits"] > 0).sum())
+    st.write("### Datapoint Coverage")
+    st.write(f"{found} of {len(table)} datapoints found in {coverage['page_count']} pages.")
+    st.dataframe(table, hide_index=True)
+
+    st.write("### Hits per Page")
+    matrix = coverage_matrix_frame(coverage)
+    if matrix.shape[1]:
+        st.dataframe(matrix)
+    st.download_button("Download hits per page (CSV)", coverage_counts_frame(coverage).to_csv(index=False),
+                       file_name="datapoint_page_hits.csv", mime="text/csv")
+
+    st.write("### Evidence")
+    for row, (indicator, datapoint) in enumerate(coverage["datapoints"]):
+        evidence = coverage["evidence"].get(row)
+        if not evidence:
+            continue
+        with st.expander(f"{datapoint} ({indicator})"):
+            for item in evidence:
+                st.markdown(f"**Page {item['page_number']}** ({', '.join(item['keywords'])})")
+                st.markdown(f"<p style='color: #00C0F9;'>{item['sentence']}</p>", unsafe_allow_html=True)
+
+# Function to scan a PDF for every datapoint of an indicator or team, with a progress bar
+def run_coverage_scan(pdf_bytes, doc_hash, keyword_catalog, team_type, indicator):
+    progress_bar = st.progress(0.0, text="Scanning the document...")
+
+    def show_progress(page_number, page_count):
+        if page_number == page_count or page_number % 10 == 0:
+            progress_bar.progress(page_number / page_count, text=f"Scanned page {page_number} of {page_count}")
+
+    coverage = scan_coverage(pdf_bytes, keyword_catalog, team_type, indicator, progress=show_progress)
+    coverage["doc_hash"] = doc_hash
+    progress_bar.empty()
+    return coverage
 
 # Streamlit UI
 def run():
@@ -191,44 +253,17 @@ def run():
 
     # Upload PDF file
     pdf_file = st.file_uploader("Upload PDF file", type=["pdf"])    
-    # URLs of the GitHub Excel files (update with actual raw GitHub links)
-    sfdr_file_url = "https://raw.github.com/Dheena1-coder/PdfAnalyzer/master/sfdr_file.xlsx"  # Replace with actual SFDR Excel file URL
-    asset_file_url = "https://raw.github.com/Dheena1-coder/PdfAnalyzer/master/asset_file.xlsx"  # Replace with actual Asset Excel file URL
-    gowtham_file_url = "https://raw.github.com/Dheena1-coder/key_or_query/main/gowtham_keywords.xlsx"
-    diversity_file_url = "https://raw.github.com/Dheena1-coder/key_or_query/main/Diversity_Keywords.xlsx" 
-    surya_file_url = "https://raw.github.com/Dheena1-coder/key_or_query/main/Governance_update_keywords.xlsx"
-
-    # Load and process the keyword dictionaries
-    sfdr_df = load_keywords_from_github(sfdr_file_url)
-    asset_df = load_keywords_from_github(asset_file_url)
-    gowtham_df = load_keywords_from_github(gowtham_file_url)
-    diversity_df = load_keywords_from_github(diversity_file_url)
-    surya_df = load_keywords_from_github(surya_file_url)
-
-    
-
-    sfdr_keywords_dict = process_keywords_to_dict(sfdr_df, 'sfdr')
-    asset_keywords_dict = process_keywords_to_dict(asset_df, 'physical assets')
-    gowtham_keywords_dict = process_keywords_to_dict(gowtham_df,'Company data - Granular segments')
-    diversity_keywords_dict = process_keywords_to_dict(diversity_df,'ENS Diversity')
-    surya_keywords_dict = process_keywords_to_dict(surya_df,'Governance annual update')
+    # Keyword catalog shared by all pages and sessions (local snapshot, refreshed in the background)
+    keyword_catalog = get_keyword_catalog()
 
     # Create dropdown for team selection
-    team_type = st.selectbox("Select Team", ["sfdr", "physical assets",'Company data','ENS Diversity','Governance annual update'])
+    team_type = st.selectbox("Select Team", TEAM_NAMES)
+    if team_type not in keyword_catalog:
+        st.warning(missing_team_message(team_type))
+        return
 
     # Display appropriate keyword dictionary based on team selection
-    if team_type == "sfdr":
-        indicators = list(sfdr_keywords_dict.keys())
-    elif team_type == "physical assets":
-        indicators = list(asset_keywords_dict.keys())
-    elif team_type == "Company data - Granular segments":
-        indicators = list(gowtham_keywords_dict.keys())
-    elif team_type == "ENS Diversity":    
-        indicators = list(diversity_keywords_dict.keys())
-    elif team_type == "Governance annual update":
-        indicators = list(surya_keywords_dict.keys())  
-    else:
-        indicators = []
+    indicators = list(keyword_catalog.get(team_type, {}).keys())
     if indicators:
         indicator = st.selectbox("Select Indicator", indicators)
     else:
@@ -237,21 +272,12 @@ def run():
         st.warning("Please select a valid indicator.")
         return
 
-    if team_type == "sfdr":
-        datapoint_names = list(sfdr_keywords_dict[indicator].keys())
-    elif team_type == "physical assets":
-        datapoint_names = list(asset_keywords_dict[indicator].keys())
-    elif team_type == "Company data - Granular segments":
-        datapoint_names = list(gowtham_keywords_dict[indicator].keys())
-    elif team_type == "ENS Diversity":    
-        datapoint_names = list(diversity_keywords_dict[indicator].keys())
-    elif team_type == "Governance annual update":
-        datapoint_names = list(surya_keywords_dict[indicator].keys())
-    else:
-        datapoint_names = []
-        
-    
-    datapoint_name = st.multiselect("Select Datapoint Names", datapoint_names)
+    datapoint_names = list(keyword_catalog[team_type][indicator].keys())
+
+    # Coverage modes check every datapoint of the indicator or team in a single scan
+    scan_scope = st.radio("Datapoints to scan", ["Selected datapoints", "Whole indicator", "Whole team"], horizontal=True)
+    if scan_scope == "Selected datapoints":
+        datapoint_name = st.multiselect("Select Datapoint Names", datapoint_names)
     
     # Keyword Text Area: Allow users to add additional keywords
     extra_keywords_input = st.text_area("Additional Keywords (comma-separated)", "")
@@ -263,82 +289,68 @@ def run():
         step=1
     )   
     # If user submits
-    if st.button("Submit"):
+    submitted = st.button("Submit")
+    if scan_scope != "Selected datapoints":
+        coverage_indicator = indicator if scan_scope == "Whole indicator" else None
+        coverage = st.session_state.get("coverage_scan")
+        if submitted:
+            if not pdf_file:
+                st.warning("Please upload a PDF file.")
+                return
+            pdf_bytes, doc_hash, _ = open_uploaded_pdf(pdf_file)
+            coverage = run_coverage_scan(pdf_bytes, doc_hash, keyword_catalog, team_type, coverage_indicator)
+            st.session_state["coverage_scan"] = coverage
+        # Reruns (e.g. a download click) show the last scan if it matches the current choices
+        if coverage and pdf_file and (coverage["team"], coverage["indicator"]) == (team_type, coverage_indicator):
+            if coverage["doc_hash"] == open_uploaded_pdf(pdf_file)[1]:
+                display_coverage(coverage)
+        return
+
+    if submitted:
         # Extract relevant keywords based on the selected datapoint names
-        selected_keywords = []
-        if team_type == "sfdr":
-            for datapoint in datapoint_name:
-                selected_keywords.extend(sfdr_keywords_dict[indicator].get(datapoint, []))
-        elif team_type == "physical assets":
-            for datapoint in datapoint_name:
-                selected_keywords.extend(asset_keywords_dict[indicator].get(datapoint, []))
-        elif team_type == "Company data - Granular segments":
-            for datapoint in datapoint_name:
-                selected_keywords.extend(gowtham_keywords_dict[indicator].get(datapoint, []))
-        elif team_type == "ENS Diversity":
-            for datapoint in datapoint_name:
-                selected_keywords.extend(diversity_keywords_dict[indicator].get(datapoint, []))                
-        elif team_type == "Governance annual update":
-            for datapoint in datapoint_name:
-                selected_keywords.extend(surya_keywords_dict[indicator].get(datapoint, []))
-        else:
-            st.write("**Keywords is not available**")
-            
-                
-        selected_keywords = list(set(selected_keywords))  # Remove duplicates
+        selected_keywords = keywords_for_datapoints(keyword_catalog, team_type, indicator, datapoint_name)
         
         # Add any extra keywords entered in the text area
         if extra_keywords_input:
-            extra_keywords = [keyword.strip() for keyword in extra_keywords_input.split(',')]
+            extra_keywords = [keyword.strip() for keyword in extra_keywords_input.split(',') if keyword.strip()]
             selected_keywords.extend(extra_keywords)
 
-        selected_keywords = list(set(selected_keywords))  # Remove duplicates after adding extra keywords
+        selected_keywords = list(dict.fromkeys(selected_keywords))  # Remove duplicates, keeping the selection order
         st.write(selected_keywords)
         # Select how many surrounding sentences to show
 
 
         if pdf_file:
             st.write("PDF file uploaded successfully.")
-            with open("temp.pdf", "wb") as f:
-                f.write(pdf_file.getbuffer())
-
-            keyword_results = {}
-            for keyword in selected_keywords:
-                keyword_results[keyword] = extract_keyword_info("temp.pdf", [keyword],surrounding_sentences_count)
-
-            filtered_results = {}
-            for keyword, matches in keyword_results.items():
-                for page, match_list in matches.items():
-                    if page not in filtered_results:
-                        filtered_results[page] = []
-                    filtered_results[page].extend(match_list)
-
-            # Display keyword stats
-            display_keyword_stats(filtered_results, selected_keywords)
-
-            # Display results for matched pages and keywords
-            if filtered_results:
-                page_images = display_pdf_pages("temp.pdf", filtered_results.keys(), selected_keywords)
-                for keyword, matches in keyword_results.items():
-                    with st.expander(f"Results for '{keyword}'"):
-                        for page, match_list in matches.items():
-                            st.markdown(f"### **Page {page}:**")
-                            
-                            # Display the image of the page
-                            if page in page_images:
-                                st.image(page_images[page], caption=f"Page {page}", use_column_width=True)
-
-                            for match in match_list:
-                                st.markdown(f"#### **Matched Sentence on Page {match['page_number']}:**")
-                                st.markdown(f"<p style='color: #00C0F9;'>{match['sentence']}</p>", unsafe_allow_html=True)
-                                st.write("**Context**: ")
-                                for context_sentence in match['surrounding_context']:
-                                    st.write(f"  - {context_sentence}")
-
-            else:
-                st.warning("No matches found for the selected keywords.")
+            pdf_bytes, doc_hash, doc = open_uploaded_pdf(pdf_file)  # From memory, kept in this session
+
+            # Keep the results across reruns so opening a full resolution page does not re-extract
+            extraction = {
+                "doc_hash": doc_hash,
+                "keywords": selected_keywords,
+                "keyword_results": {keyword: {} for keyword in selected_keywords},
+                "pages_scanned": 0,
+                "page_count": None,
+                "complete": False,
+            }
+            st.session_state["keyword_extraction"] = extraction
+
+            # Scan the document once for all selected keywords, showing matches page by page;
+            # once done, the live view is replaced by the interactive one
+            live_view = st.empty()
+            with live_view.container():
+                stream_extraction(doc, pdf_bytes, extraction, surrounding_sentences_count)
+            live_view.empty()
+            display_extraction_results(doc, extraction)
+            return
         else:
             st.warning("Please upload a PDF file.")
 
+    extraction = st.session_state.get("keyword_extraction")
+    if pdf_file and extraction:
+        _, doc_hash, doc = open_uploaded_pdf(pdf_file)
+        if doc_hash == extraction["doc_hash"]:
+            display_extraction_results(doc, extraction)
+
 if __name__ == "__main__":
     run()
@@ -0,0 +1,190 @@
+import bisect
+import re
+
+from instrumentation import timed
+
+try:
+    import ahocorasick  # pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Build a single matcher for a whole list of keywords.
+# The keywords go into one Aho-Corasick automaton over the lowercased text, so a scan
+# reads each character once whatever the number of keywords, and overlapping keywords
+# (e.g. "emission" and "emissions") are all reported. Without pyahocorasick the keywords
+# are compiled into one regex factored as a trie (one branch per distinct next
+# character), which keeps the cost per position close to flat in the keyword count.
+def compile_keyword_matcher(keywords, whole_words=False):
+    # Group the original keywords by their lowercase form, dropping empty entries
+    keyword_groups = {}
+    for keyword in keywords:
+        lowered = keyword.strip().lower()
+        if not lowered:
+            continue
+        keyword_groups.setdefault(lowered, [])
+        if keyword not in keyword_groups[lowered]:
+            keyword_groups[lowered].append(keyword)
+
+    terms = sorted(keyword_groups, key=len, reverse=True)
+
+    automaton = None
+    pattern = None
+    prefixes = {}
+    if terms and ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for term in terms:
+            automaton.add_word(term, term)
+        automaton.make_automaton()
+    elif terms:
+        trie = {}
+        for term in terms:
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[""] = term
+        # For each term, the shorter terms that are prefixes of it. When the regex reports
+        # the longest term at a position, these are the other terms starting there too.
+        for term in terms:
+            node = trie
+            prefixes[term] = []
+            for char in term[:-1]:
+                node = node[char]
+                if "" in node:
+                    prefixes[term].insert(0, node[""])
+        pattern = re.compile(f"(?=({_trie_pattern(trie)}))", re.IGNORECASE)
+
+    return {
+        "automaton": automaton,
+        "pattern": pattern,
+        "terms": terms,
+        "keyword_groups": keyword_groups,
+        "prefixes": prefixes,
+        "whole_words": whole_words,
+    }
+
+# Function to turn a trie ({char: child, "": term}) into a regex that matches the longest
+# term first: each node is one alternation of its next characters, optional where a
+# term ends
+def _trie_pattern(node):
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        pattern = f"(?:{pattern})?"
+    return pattern
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+# Function to lowercase a text without changing its length, so offsets found in the
+# lowercased text are offsets in the original (e.g. "İ" lowercases to two characters)
+def _lower_same_length(text):
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+    return lowered
+
+# Function to yield every (start, term) occurrence in a text, overlapping ones included
+# (whole-word matchers skip occurrences inside a word)
+def _iter_occurrences(matcher, text):
+    whole_words = matcher["whole_words"]
+    if matcher["automaton"] is not None:
+        candidates = ((end + 1 - len(term), term) for end, term in matcher["automaton"].iter(_lower_same_length(text)))
+    else:
+        candidates = (
+            (match.start(1), candidate)
+            for match in matcher["pattern"].finditer(text)
+            if match.group(1).lower() in matcher["prefixes"]
+            for candidate in [match.group(1).lower()] + matcher["prefixes"][match.group(1).lower()]
+        )
+    for start, term in candidates:
+        end = start + len(term)
+        if whole_words and ((start > 0 and _is_word_char(text[start - 1])) or (end < len(text) and _is_word_char(text[end]))):
+            continue
+        yield start, term
+
+# Find every keyword occurrence in a text as (start, end, term) tuples, ordered by start
+# (longest term first). Occurrences of the same term never overlap, matching str.count
+# semantics.
+def find_keyword_hits(matcher, text):
+    hits = []
+    if not matcher["terms"] or not text:
+        return hits
+
+    last_end = {}
+    for start, term in sorted(_iter_occurrences(matcher, text), key=lambda occurrence: (occurrence[0], -len(occurrence[1]))):
+        if start < last_end.get(term, 0):
+            continue
+        end = start + len(term)
+        last_end[term] = end
+        hits.append((start, end, term))
+    return hits
+
+# Function to split the hits of a whole page by sentence, so a page is scanned once.
+# spans are the page's (start, end) sentence spans in order. Returns
+# {sentence index: [(start, end, term), ...]} with offsets relative to the sentence; a hit
+# that crosses a sentence boundary belongs to neither sentence and is dropped.
+def hits_by_sentence(hits, spans):
+    grouped = {}
+    starts = [start for start, _ in spans]
+    for start, end, term in hits:
+        index = bisect.bisect_right(starts, start) - 1
+        if index < 0 or end > spans[index][1]:
+            continue
+        sentence_start = spans[index][0]
+        grouped.setdefault(index, []).append((start - sentence_start, end - sentence_start, term))
+    return grouped
+
+# Wrap the given character spans of a text in the red bold highlight markup
+def highlight_spans(text, spans):
+    # Merge overlapping spans so nested keywords produce one highlighted run
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    highlighted = []
+    position = 0
+    for start, end in merged:
+        highlighted.append(text[position:start])
+        highlighted.append(f'<b style="color: red;">{text[start:end]}</b>')
+        position = end
+    highlighted.append(text[position:])
+    return "".join(highlighted)
+
+# Scan the sentences of one page once and collect the matches for every keyword.
+# Returns {keyword: [match, ...]} using the original keyword spelling as key.
+# sentence_boxes, if given, holds the (x0, y0, x1, y1) box of each sentence for the match.
+# sentence_hits, if given, holds the hits of each sentence from a scan of the whole page
+# (hits_by_sentence), and the sentences are not scanned again.
+@timed("keyword_match")
+def match_page_sentences(matcher, sentences, page_number, surrounding_sentences_count=2, sentence_boxes=None, sentence_hits=None):
+    page_matches = {}
+    for idx, sentence in enumerate(sentences):
+        hits = sentence_hits.get(idx) if sentence_hits is not None else find_keyword_hits(matcher, sentence)
+        if not hits:
+            continue
+
+        spans_by_term = {}
+        for start, end, term in hits:
+            spans_by_term.setdefault(term, []).append((start, end))
+
+        start_idx = max(0, idx - surrounding_sentences_count)
+        end_idx = min(len(sentences), idx + surrounding_sentences_count + 1)
+        surrounding = sentences[start_idx:end_idx]
+
+        for term, spans in spans_by_term.items():
+            match = {
+                "sentence": highlight_spans(sentence, spans),
+                "text": sentence,
+                "spans": spans,  # Offsets of this keyword in text, used for the statistics
+                "surrounding_context": surrounding,
+                "page_number": page_number,
+                "bbox": tuple(sentence_boxes[idx].tolist()) if sentence_boxes is not None else None,
+            }
+            for keyword in matcher["keyword_groups"][term]:
+                page_matches.setdefault(keyword, []).append(match)
+    return page_matches
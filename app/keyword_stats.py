@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from keyword_matcher import compile_keyword_matcher, find_keyword_hits
+
+try:
+    from scipy import sparse  # Comes with scikit-learn; only needed for the sparse matrix
+except ImportError:
+    sparse = None
+
+# Keyword statistics built from the match offsets the matcher produces, in one pass.
+# Counts are accumulated as (keyword row, page, count) triplets:
+#   keywords       the keywords in their original spelling, one row each
+#   keyword_rows   {keyword: row}
+#   rows / pages / counts   the triplets; a (row, page) pair may appear more than once
+# and is summed when the statistics are read.
+
+# Function to start an empty statistics accumulator for a list of keywords
+def new_keyword_stats(keywords):
+    unique_keywords = list(dict.fromkeys(keywords))
+    return {
+        "keywords": unique_keywords,
+        "keyword_rows": {keyword: row for row, keyword in enumerate(unique_keywords)},
+        "rows": [],
+        "pages": [],
+        "counts": [],
+    }
+
+# Function to add the occurrences of some keywords on one page
+def add_page_counts(stats, page_number, keyword_counts):
+    for keyword, count in keyword_counts.items():
+        row = stats["keyword_rows"].get(keyword)
+        if row is not None and count:
+            stats["rows"].append(row)
+            stats["pages"].append(page_number)
+            stats["counts"].append(count)
+    return stats
+
+# Function to count the occurrences per keyword in the matches of one page
+# ({keyword: [match, ...]} as returned by match_page_sentences). Each match carries the
+# offsets of its keyword in the sentence, so nothing is recounted.
+def page_keyword_counts(page_matches):
+    return {keyword: sum(len(match["spans"]) for match in matches) for keyword, matches in page_matches.items()}
+
+# Function to build the statistics of an extraction ({keyword: {page: [match, ...]}})
+def stats_from_keyword_results(keyword_results, keywords=None):
+    stats = new_keyword_stats(keywords if keywords is not None else list(keyword_results))
+    for keyword, pages in keyword_results.items():
+        for page_number, matches in pages.items():
+            add_page_counts(stats, page_number, {keyword: sum(len(match["spans"]) for match in matches)})
+    return stats
+
+# Function to count every keyword in a list of sentences with one matcher pass per sentence
+# (page_ids gives the page number of each sentence). keywords may be a list of keywords
+# or a matcher from compile_keyword_matcher.
+def count_keyword_hits(keywords, sentences, page_ids):
+    matcher = keywords if isinstance(keywords, dict) else compile_keyword_matcher(keywords)
+    stats = new_keyword_stats(keywords if not isinstance(keywords, dict)
+                              else [keyword for term in matcher["terms"] for keyword in matcher["keyword_groups"][term]])
+    for sentence, page_number in zip(sentences, page_ids):
+        hits = find_keyword_hits(matcher, sentence)
+        if not hits:
+            continue
+        term_counts = {}
+        for _, _, term in hits:
+            term_counts[term] = term_counts.get(term, 0) + 1
+        add_page_counts(stats, int(page_number), {
+            keyword: count
+            for term, count in term_counts.items()
+            for keyword in matcher["keyword_groups"][term]
+        })
+    return stats
+
+# Function to sum the triplets into unique (row, page, count) arrays sorted by row, then page
+def aggregate_counts(stats):
+    rows = np.asarray(stats["rows"], dtype=np.int64)
+    pages = np.asarray(stats["pages"], dtype=np.int64)
+    counts = np.asarray(stats["counts"], dtype=np.int64)
+    if not len(rows):
+        return rows, pages, counts
+
+    stride = int(pages.max()) + 1
+    unique_keys, inverse = np.unique(rows * stride + pages, return_inverse=True)
+    summed = np.bincount(inverse, weights=counts).astype(np.int64)
+    return unique_keys // stride, unique_keys % stride, summed
+
+# Function to build the statistics table: total occurrences and sorted pages per keyword
+def stats_frame(stats):
+    rows, pages, counts = aggregate_counts(stats)
+    keyword_count = len(stats["keywords"])
+    occurrences = np.bincount(rows, weights=counts, minlength=keyword_count).astype(np.int64)
+    # One (possibly empty) page list per keyword; rows are sorted, so each keyword's pages
+    # are the slice between its first and last triplet
+    bounds = np.searchsorted(rows, np.arange(keyword_count + 1)).tolist()
+    page_lists = [pages[bounds[row]:bounds[row + 1]].tolist() for row in range(keyword_count)]
+    return pd.DataFrame({
+        "Keyword": stats["keywords"],
+        "Occurrences": occurrences,
+        "Pages": page_lists,
+    })
+
+# Function to build the keyword x page count matrix (row i is stats["keywords"][i], column j
+# is page j + 1). Returns a scipy CSR matrix when scipy is installed and sparse_output is
+# set, otherwise a dense NumPy array.
+def keyword_page_matrix(stats, page_count=None, sparse_output=True):
+    rows, pages, counts = aggregate_counts(stats)
+    shape = (len(stats["keywords"]), page_count or (int(pages.max()) if len(pages) else 0))
+    if sparse_output and sparse is not None:
+        return sparse.csr_matrix((counts, (rows, pages - 1)), shape=shape)
+    matrix = np.zeros(shape, dtype=np.int64)
+    matrix[rows, pages - 1] = counts
+    return matrix
+
+# Function to export the non-zero counts in long form (Keyword, Page, Count)
+def counts_frame(stats):
+    rows, pages, counts = aggregate_counts(stats)
+    return pd.DataFrame({
+        "Keyword": [stats["keywords"][row] for row in rows.tolist()],
+        "Page": pages,
+        "Count": counts,
+    })
@@ -0,0 +1,158 @@
+import os
+import re
+
+import fitz  # PyMuPDF
+import numpy as np
+
+# Layout-aware sentence segmentation. A page is read once with get_text("dict"), which
+# gives the same text as get_text("text") together with its block and line structure and
+# a box per line. Lines are first grouped into units: a unit never crosses a block, a
+# list bullet, or a line that stops well short of its block's right edge (headings, table
+# cells, the last line of a paragraph). Each unit is then split into sentences with a
+# compiled regex (or Punkt), and every sentence gets the bounding box of its lines, so
+# tables and bullet lists no longer merge into one long pseudo-sentence.
+
+# Sentence splitter used inside the layout units of a page: "regex" (compiled, no data
+# needed) or "punkt" (NLTK)
+SENTENCE_SPLITTER = os.environ.get("EXTRACTOR_SENTENCE_SPLITTER", "regex")
+
+# A line ending before this share of its block's width is a hard break, unless the next
+# line starts in lowercase (a sentence wrapping around a figure or a narrow column)
+SHORT_LINE_RATIO = 0.7
+
+_BULLET = re.compile(r"\s*(?:[•●▪◦■□➢►✓*\-–—]|\(?(?:\d{1,2}|[a-zA-Z])[.)])\s")
+# Group 1 is the whitespace between the sentence and the next one
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*(\s+)(?=[\"'“‘(\[]?[A-Z0-9•])")
+_ABBREVIATIONS = frozenset(
+    "e.g i.e etc vs cf al no nos fig figs tab eq mr mrs ms dr prof inc ltd co corp plc approx "
+    "dept est jan feb mar apr jun jul aug sep sept oct nov dec st pp vol art para u.s u.k".split()
+)
+
+# Function to read the text and line layout of a fitz page. Returns the page text (lines
+# joined with "\n", as get_text("text")), an int32 (n, 2) array of line (start, end)
+# offsets, a float32 (n, 4) array of line boxes and an int32 array with each line's block.
+def page_layout(page, textpage=None):
+    parts = []
+    line_spans = []
+    line_boxes = []
+    line_blocks = []
+    offset = 0
+    layout = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT, textpage=textpage)
+    for block_index, block in enumerate(layout["blocks"]):
+        for line in block.get("lines", ()):
+            line_text = "".join(span["text"] for span in line["spans"])
+            parts.append(line_text)
+            parts.append("\n")
+            line_spans.append((offset, offset + len(line_text)))
+            line_boxes.append(line["bbox"])
+            line_blocks.append(block_index)
+            offset += len(line_text) + 1
+    return (
+        "".join(parts),
+        np.array(line_spans, dtype=np.int32).reshape(-1, 2),
+        np.array(line_boxes, dtype=np.float32).reshape(-1, 4),
+        np.array(line_blocks, dtype=np.int32),
+    )
+
+# Function to group the lines of a page into units that sentences never cross.
+# Returns a list of (first line, last line) pairs.
+def layout_units(text, line_spans, line_boxes, line_blocks):
+    spans = line_spans.tolist()
+    boxes = line_boxes.tolist()
+    blocks = line_blocks.tolist()
+    if not spans:
+        return []
+
+    # Width of each block, from the extent of its lines
+    block_left = {}
+    block_right = {}
+    for block, box in zip(blocks, boxes):
+        block_left[block] = min(block_left.get(block, box[0]), box[0])
+        block_right[block] = max(block_right.get(block, box[2]), box[2])
+
+    units = []
+    first = 0
+    for line in range(len(spans) - 1):
+        block = blocks[line]
+        next_text = text[spans[line + 1][0]:spans[line + 1][1]]
+        # A wrapped line spans most of its block; a short one (heading, table cell) ends the unit
+        short_line = boxes[line][2] - boxes[line][0] < SHORT_LINE_RATIO * (block_right[block] - block_left[block])
+        if (blocks[line + 1] != block
+                or _BULLET.match(next_text)
+                or (short_line and not next_text.lstrip()[:1].islower())):
+            units.append((first, line))
+            first = line + 1
+    units.append((first, len(spans) - 1))
+    return units
+
+# Function to split the text between start and end into sentence spans with the compiled
+# splitter: a sentence ends at . ! ? (and closing quotes or brackets) followed by
+# whitespace and an uppercase letter, digit or bullet, unless the word is an abbreviation
+# or an initial
+def regex_sentence_spans(text, start, end):
+    spans = []
+    sentence_start = start
+    for match in _SENTENCE_END.finditer(text, start, end):
+        # The word the terminator ends, e.g. "e.g" or an initial, which does not end a sentence
+        word_start = max(text.rfind(" ", start, match.start()), text.rfind("\n", start, match.start())) + 1
+        word = text[max(word_start, start):match.start()].lstrip("([\"'").lower()
+        if word in _ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+            continue
+        spans.append((sentence_start, match.start(1)))
+        sentence_start = match.end(1)
+    spans.append((sentence_start, end))
+    return spans
+
+def _punkt_sentence_spans(text, start, end):
+    from resources import get_sentence_tokenizer
+    return [(start + span_start, start + span_end) for span_start, span_end in get_sentence_tokenizer().span_tokenize(text[start:end])]
+
+def _strip_span(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+# Function to get the bounding boxes of many (start, end) text spans at once from the
+# boxes of the lines each one covers; a span on a single line is narrowed to its characters
+def span_boxes(line_spans, line_boxes, spans):
+    if not len(spans):
+        return np.zeros((0, 4), dtype=np.float32)
+    spans = np.asarray(spans, dtype=np.int64)
+    first = np.searchsorted(line_spans[:, 1], spans[:, 0], side="right")  # First line ending after the start
+    last = np.searchsorted(line_spans[:, 0], spans[:, 1], side="left") - 1  # Last line starting before the end
+
+    # Reduce over each [first, last] range of lines: reduceat on interleaved bounds, with a
+    # padding row so last + 1 is always a valid index
+    padded = np.vstack([line_boxes, np.zeros((1, 4), dtype=line_boxes.dtype)])
+    bounds = np.column_stack([first, last + 1]).ravel()
+    boxes = np.column_stack([
+        np.minimum.reduceat(padded[:, 0], bounds)[::2],
+        np.minimum.reduceat(padded[:, 1], bounds)[::2],
+        np.maximum.reduceat(padded[:, 2], bounds)[::2],
+        np.maximum.reduceat(padded[:, 3], bounds)[::2],
+    ]).astype(np.float32)
+
+    single = first == last
+    if single.any():
+        line = first[single]
+        line_starts = line_spans[line, 0]
+        char_width = (line_boxes[line, 2] - line_boxes[line, 0]) / np.maximum(line_spans[line, 1] - line_starts, 1)
+        boxes[single, 0] = line_boxes[line, 0] + char_width * (spans[single, 0] - line_starts)
+        boxes[single, 2] = line_boxes[line, 0] + char_width * (spans[single, 1] - line_starts)
+    return boxes
+
+# Function to split a page into sentences. splitter is "regex" (the compiled splitter) or
+# "punkt" (NLTK). Returns the (start, end) sentence spans in the page text and a float32
+# (n, 4) array with the bounding box of each sentence.
+def segment_page(text, line_spans, line_boxes, line_blocks, splitter="regex"):
+    split = _punkt_sentence_spans if splitter == "punkt" else regex_sentence_spans
+    offsets = line_spans.tolist()
+    spans = []
+    for first, last in layout_units(text, line_spans, line_boxes, line_blocks):
+        for start, end in split(text, offsets[first][0], offsets[last][1]):
+            start, end = _strip_span(text, start, end)
+            if start < end:
+                spans.append((start, end))
+    return spans, span_boxes(line_spans, line_boxes, spans)
@@ -1,11 +1,16 @@
 import streamlit as st
+import instrumentation
+import resources
 
 # Set the page configuration (optional)
 st.set_page_config(page_title="Extractor", page_icon=":material/edit:")
 
 # Sidebar for navigation (without "About" in the dropdown)
 page = st.sidebar.selectbox("Select a page", 
-                            ["Keyword Based Extractor", "Query Based Extractor"])
+                            ["Keyword Based Extractor", "Query Based Extractor", "Corpus Search"])
+
+# Time the hot paths of this script run (see instrumentation.py)
+metrics_run = instrumentation.start_run(page)
 
 # Add a gap after the page select box
 st.sidebar.markdown("<br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br><br>", unsafe_allow_html=True)  # This adds extra vertical space
@@ -13,6 +18,7 @@ st.sidebar.markdown("<br><br><br><br><br><br><br><br><br><br><br><br><br><br><br
 st.sidebar.markdown("---")  # This adds a horizontal line to separate sections
 st.sidebar.markdown("### About")
 about_link = st.sidebar.button("Go to About Page")  # Button to trigger the About page
+show_timings = st.sidebar.checkbox("Show timings")
 
 # If the "About" button is clicked, show the About page content only and stop any further rendering
 if about_link:
@@ -33,3 +39,18 @@ else:
         # Import and run the web extraction page
         import query_extractor
         query_extractor.run()
+
+    elif page == "Corpus Search":
+        # Import and run the cross-document search page
+        import corpus_search
+        corpus_search.run()
+
+# Keep the timings of the last run that did measurable work (not of a plain checkbox rerun)
+metrics_summary = instrumentation.finish_run(metrics_run)
+if metrics_summary["stages"] or "last_run_metrics" not in st.session_state:
+    st.session_state["last_run_metrics"] = metrics_summary
+if show_timings:
+    instrumentation.display_timing_panel(st.session_state["last_run_metrics"])
+
+# Load the NLTK data and embedding model in the background once the page has been drawn
+resources.start_background_warmup()
@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageEnhance  # Import Pillow for image processing
+
+from doc_cache import cached_page_words
+from highlight_locator import locate_keywords, page_words_from_page
+from instrumentation import span, timed
+
+# Render tiers: cheap thumbnails shown first, full resolution only when a page is opened
+THUMBNAIL_DPI = 60
+THUMBNAIL_FORMAT = "JPEG"
+FULL_DPI = 300
+FULL_FORMAT = "PNG"
+
+# Rendered images are kept in a shared LRU cache bounded by total encoded size
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTOR_RENDER_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+_render_cache = OrderedDict()
+_render_cache_bytes = 0
+_render_cache_lock = threading.Lock()
+
+# Function to copy one page (1-based) of an open document into a new in-memory document
+# and draw a rectangle around every keyword occurrence on it. The source document is
+# left untouched and nothing is written to disk. page_words are the page's cached word
+# boxes (see highlight_locator); without them the words are read from the page once.
+# rects are extra (x0, y0, x1, y1) boxes to draw, such as the box of a retrieved sentence.
+@timed("highlight")
+def highlight_page(doc, page_number, keywords, color=(0, 1, 0), width=1, page_words=None, rects=()):
+    page_doc = fitz.open()
+    page_doc.insert_pdf(doc, from_page=page_number - 1, to_page=page_number - 1)
+    page = page_doc.load_page(0)
+
+    if page_words is None:
+        page_words = page_words_from_page(page)
+    keyword_rects = locate_keywords(page_words, keywords)  # All keywords in one pass over the words
+
+    if keyword_rects or rects:
+        shape = page.new_shape()  # One drawing for all rectangles
+        for rect in [rect for _, rect in keyword_rects] + list(rects):
+            shape.draw_rect(fitz.Rect(rect))
+        shape.finish(color=color, width=width)
+        shape.commit()
+
+    return page_doc
+
+# Function to rasterize a page straight to encoded image bytes
+def render_page_image(page, dpi=300, contrast=1.5, image_format="PNG"):
+    with span("render_pixmap"):
+        pix = page.get_pixmap(dpi=dpi)
+    pil_image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+    with span("render_encode"):
+        if contrast != 1:
+            pil_image = ImageEnhance.Contrast(pil_image).enhance(contrast)
+
+        img_byte_arr = BytesIO()
+        if image_format == "JPEG":
+            pil_image.save(img_byte_arr, format=image_format, quality=75)
+        else:
+            pil_image.save(img_byte_arr, format=image_format)
+    img_byte_arr.seek(0)
+    return img_byte_arr
+
+# Function to highlight keywords on one page and return the rendered image
+def render_highlighted_page(doc, page_number, keywords, dpi=300, contrast=1.5, image_format="PNG", page_words=None):
+    page_doc = highlight_page(doc, page_number, keywords, page_words=page_words)
+    try:
+        return render_page_image(page_doc.load_page(0), dpi, contrast, image_format)
+    finally:
+        page_doc.close()
+
+# Function to build the render cache key; keyword order and case do not matter
+def render_cache_key(doc_hash, page_number, keywords, dpi, image_format):
+    keyword_set = tuple(sorted({keyword.lower() for keyword in keywords}))
+    return (doc_hash, page_number, keyword_set, dpi, image_format)
+
+# Function to get the encoded image of a highlighted page, rendering it only on a cache miss
+def get_page_image(doc, doc_hash, page_number, keywords, dpi=THUMBNAIL_DPI, image_format=THUMBNAIL_FORMAT):
+    global _render_cache_bytes
+    key = render_cache_key(doc_hash, page_number, keywords, dpi, image_format)
+
+    with _render_cache_lock:
+        image_bytes = _render_cache.get(key)
+        if image_bytes is not None:
+            _render_cache.move_to_end(key)
+            return image_bytes
+
+    page_words = cached_page_words(doc_hash, page_number - 1)
+    image_bytes = render_highlighted_page(doc, page_number, keywords, dpi=dpi, image_format=image_format, page_words=page_words).getvalue()
+
+    with _render_cache_lock:
+        if key not in _render_cache:
+            _render_cache[key] = image_bytes
+            _render_cache_bytes += len(image_bytes)
+        while _render_cache_bytes > RENDER_CACHE_MAX_BYTES and len(_render_cache) > 1:
+            _, evicted = _render_cache.popitem(last=False)
+            _render_cache_bytes -= len(evicted)
+    return image_bytes
+
+# Function to empty the render cache (e.g. between benchmark rounds)
+def clear_render_cache():
+    global _render_cache_bytes
+    with _render_cache_lock:
+        _render_cache.clear()
+        _render_cache_bytes = 0
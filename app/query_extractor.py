@@ -1,65 +1,23 @@
 
 import streamlit as st
-import faiss
-from sentence_transformers import SentenceTransformer
-from nltk.tokenize import sent_tokenize
-import tempfile
 import fitz  # PyMuPDF
 from io import BytesIO
 from PIL import Image
 import pandas as pd
-import nltk
 import concurrent.futures
 import numpy as np
-
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-except LookupError:
-    nltk.download('punkt_tab')# Load the transformer model for embeddings
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# Load the SFDR and Asset Keyword data from GitHub (URLs directly)
-def load_keywords_from_github(url):
-    # Load the Excel file directly from GitHub
-    df = pd.read_excel(url, engine='openpyxl')  
-    return df
-
-# Process data into dictionary
-def process_keywords_to_dict(df, team_type):
-    keyword_dict = {}
-    for index, row in df.iterrows():
-        indicator = None
-        if team_type == 'sfdr':
-            indicator = row['SFDR Indicator']  
-        elif team_type == 'physical assets': 
-            indicator = row['Asset/Report Type']
-        elif team_type == 'Company data - Granular segments': 
-            indicator = row['Granular Indicator']
-        elif team_type == 'ENS Diversity': 
-            indicator = row['Div_Indicators'] 
-        elif team_type == 'Governance annual update': 
-            indicator = row['CG- Indicator']
-        # Check if the indicator is valid (not None or empty)
-        if not indicator:
-            continue  # Skip this row if indicator is invalid            
-        datapoint_name = row['Datapoint Name']
-        keywords = row['Keywords'].split(',')
-        keywords = [keyword.strip() for keyword in keywords]
-
-        if indicator not in keyword_dict:
-            keyword_dict[indicator] = {}
-
-        if datapoint_name not in keyword_dict[indicator]:
-            keyword_dict[indicator][datapoint_name] = []
-
-        keyword_dict[indicator][datapoint_name].extend(keywords)
-
-    # Optional: Remove duplicates within each list of keywords for each Datapoint Name
-    for indicator in keyword_dict:
-        for datapoint in keyword_dict[indicator]:
-            keyword_dict[indicator][datapoint] = list(set(keyword_dict[indicator][datapoint]))
-
-    return keyword_dict
+from chunk_store import build_chunk_store, chunk_count, get_chunk
+from doc_cache import load_parsed_document
+from embedding_store import load_or_build_index
+from hybrid_retriever import hybrid_search
+from instrumentation import span
+from keyword_stats import count_keyword_hits, stats_frame
+from page_renderer import highlight_page
+from keyword_catalog import TEAM_NAMES, get_keyword_catalog, keywords_for_datapoints, missing_team_message
+from resources import MODEL_NAME
+from sentence_encoder import encode_sentences
+from vector_index import INDEX_TYPE, build_index
+from workspace import open_uploaded_pdf
 
 # Function to upload PDF
 def upload_pdf():
@@ -70,90 +28,73 @@ def upload_pdf():
 
 # Function to extract text and word positions from PDF (with page number tracking)
 def extract_pdf_content(pdf_file):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-        temp_file.write(pdf_file.read())
-        temp_file_path = temp_file.name
-        
-    doc = fitz.open(temp_file_path)
-    text_chunks = []
-    word_positions = []  # To store word positions for highlighting
-    
-    # Extract text and word positions from each page
-    for page_number, page in enumerate(doc, start=1):
-        text = page.get_text("text")  # Extract text from the page
-        words = page.get_text("words")  # Extract word positions
-        
-        # Store each sentence with its respective page and word positions
-        text_chunks.extend([(sent, page_number, words) for sent in sent_tokenize(text)])
-    
-    return text_chunks, doc  # Return text with word positions and the document object for highlighting
+    pdf_bytes, _, doc = open_uploaded_pdf(pdf_file)  # Opened from memory, kept in this session
+    parsed = load_parsed_document(pdf_bytes)  # Cached by content hash, so reruns skip parsing
+
+    # Columnar store: sentences, page ids and offsets per chunk, word boxes once per page
+    chunk_store = build_chunk_store(parsed)
+
+    return chunk_store, doc, parsed["doc_hash"]  # Return the chunks, the document object for highlighting and its content hash
 
-# Function to create embeddings
-def create_embeddings(text_chunks):
-    text_only = [chunk[0] for chunk in text_chunks]  # Extract sentences (text only) from tuples
-    embeddings = model.encode(text_only)
+# Function to create embeddings (unit length, so inner product equals cosine similarity).
+# Repeated sentences are encoded once and reused across documents.
+def create_embeddings(chunk_store):
+    embeddings = encode_sentences(chunk_store["sentences"])
     return embeddings
 
 # Function to build vector database
-def build_vector_database(embeddings):
-    index = faiss.IndexFlatL2(embeddings.shape[1])
-    index.add(embeddings)
-    return index
+def build_vector_database(embeddings, index_type=INDEX_TYPE):
+    return build_index(embeddings, index_type)
 
 # Function to retrieve context based on user query
-def retrieve_context(query, text_chunks, index):
-    query_embedding = model.encode([query])
-    distances, indices = index.search(query_embedding, k=5)
-    return [(text_chunks[i][0], text_chunks[i][1], text_chunks[i][2], distances[0][j]) for j, i in enumerate(indices[0])]
-
-# Function to highlight matching words in the PDF (including keywords from the query)
-def highlight_text_on_pdf(doc, query, selected_keywords, page_number):
-    page = doc.load_page(page_number - 1)  # Page numbers are 0-indexed in PyMuPDF
-    
-    # Initialize a set of text instances to highlight
-    text_instances = set()
-    
-    # Search for the query on the page and add to the instances set
-    text_instances.update(page.search_for(query)) 
-    
-    # Search for each selected keyword and add to the instances set
-    for keyword in selected_keywords:
-        text_instances.update(page.search_for(keyword))  # This finds the exact position of each keyword
-    
-    # Loop through all the instances and draw highlights around them
-    for inst in text_instances:
-        rect = fitz.Rect(inst)  # Create a rectangle based on the text instance
-        page.draw_rect(rect, color=(0, 1, 0), width=2)  # Draw a green rectangle around the keyword (no fill)
-    
-    return doc
+def retrieve_context(query, chunk_store, index, k=5, boost_keywords=()):
+    return retrieve_contexts([query], chunk_store, index, k, boost_keywords)[0]
+
+# Function to retrieve the top k contexts for many queries at once: all queries are
+# encoded in one batched encode, searched with a single matrix index.search and
+# fused with BM25 keyword scores. Sentences containing boost_keywords rank higher.
+def retrieve_contexts(queries, chunk_store, index, k=5, boost_keywords=()):
+    query_embeddings = encode_sentences(queries, use_cache=False)
+    ranked = hybrid_search(queries, query_embeddings, chunk_store, index, k, boost_keywords)
+    return [
+        [(*get_chunk(chunk_store, chunk_index), score) for chunk_index, score in query_ranked]
+        for query_ranked in ranked
+    ]
+
+# Function to put the results of a batch of queries into one table
+def build_results_table(queries, results):
+    rows = []
+    for query, query_results in zip(queries, results):
+        for rank, (sentence, page_number, _, score) in enumerate(query_results, start=1):
+            rows.append([query, rank, page_number, sentence, float(score)])
+    return pd.DataFrame(rows, columns=["Query", "Rank", "Page", "Sentence", "Score"])
+
+# Function to highlight matching words in the PDF (including keywords from the query).
+# The page is copied into a one-page in-memory document, so the session's open document
+# does not collect rectangles from earlier queries. Returns the copy (its page 1).
+# The query and all keywords are located in one pass over the page's cached word boxes;
+# the retrieved sentence is outlined from its stored box, without searching for its text.
+def highlight_text_on_pdf(doc, query, selected_keywords, page_number, page_words=None, sentence_box=None):
+    rects = [sentence_box] if sentence_box is not None else []
+    return highlight_page(doc, page_number, [query] + list(selected_keywords), color=(0, 1, 0), width=2, page_words=page_words, rects=rects)
+
+# Function to get the cached (boxes, texts, ids) words of one page (1-based) from the chunk store
+def chunk_store_page_words(chunk_store, page_number):
+    page_index = page_number - 1
+    return chunk_store["page_word_boxes"][page_index], chunk_store["page_word_texts"][page_index], chunk_store["page_word_ids"][page_index]
 
 # Function to convert page to image with higher DPI and highlights
 def page_to_image_with_highlights(doc, page_number, dpi_scale=2):
     page = doc.load_page(page_number - 1)  # Page numbers are 0-indexed in PyMuPDF
     mat = fitz.Matrix(dpi_scale, dpi_scale)  # Scale the DPI by the desired factor
-    img = page.get_pixmap(matrix=mat)  # Get the page as a pixmap (image) with higher resolution
+    with span("render_pixmap"):
+        img = page.get_pixmap(matrix=mat)  # Get the page as a pixmap (image) with higher resolution
     return Image.open(BytesIO(img.tobytes()))  # Convert to image
 
 # Function to calculate keyword statistics (frequency of occurrence)
-def calculate_keyword_statistics(text_chunks, selected_keywords):
-    keyword_stats = {}
-    
-    # Initialize stats dictionary for each selected keyword
-    for keyword in selected_keywords:
-        keyword_stats[keyword] = {
-            'occurrences': 0,
-            'pages': set()  # Set to avoid duplicate page numbers
-        }
-    
-    # Count occurrences of keywords in the text chunks
-    for sentence, page_number, _ in text_chunks:
-        for keyword in selected_keywords:
-            occurrences_in_sentence = sentence.lower().count(keyword.lower())
-            if occurrences_in_sentence > 0:
-                keyword_stats[keyword]['occurrences'] += occurrences_in_sentence
-                keyword_stats[keyword]['pages'].add(page_number)  # Track the page number where the keyword appears
-    
-    return keyword_stats
+# All keywords are counted in one matcher pass over the sentences of the document
+def calculate_keyword_statistics(chunk_store, selected_keywords):
+    return count_keyword_hits(selected_keywords, chunk_store["sentences"], chunk_store["page_ids"].tolist())
 
 
 def run():
@@ -169,44 +110,17 @@ def run():
         st.warning("Please upload a PDF file.")
         return
 
-    # URLs of the GitHub Excel files (update with actual raw GitHub links)
-    sfdr_file_url = "https://raw.github.com/Dheena1-coder/PdfAnalyzer/master/sfdr_file.xlsx"  # Replace with actual SFDR Excel file URL
-    asset_file_url = "https://raw.github.com/Dheena1-coder/PdfAnalyzer/master/asset_file.xlsx"  # Replace with actual Asset Excel file URL
-    gowtham_file_url = "https://raw.github.com/Dheena1-coder/key_or_query/main/gowtham_keywords.xlsx"
-    diversity_file_url = "https://raw.github.com/Dheena1-coder/key_or_query/main/Diversity_Keywords.xlsx" 
-    surya_file_url = "https://raw.github.com/Dheena1-coder/key_or_query/main/Governance_update_keywords.xlsx"
-
-    # Load and process the keyword dictionaries
-    sfdr_df = load_keywords_from_github(sfdr_file_url)
-    asset_df = load_keywords_from_github(asset_file_url)
-    gowtham_df = load_keywords_from_github(gowtham_file_url)
-    diversity_df = load_keywords_from_github(diversity_file_url)
-    surya_df = load_keywords_from_github(surya_file_url)
-
-    
-
-    sfdr_keywords_dict = process_keywords_to_dict(sfdr_df, 'sfdr')
-    asset_keywords_dict = process_keywords_to_dict(asset_df, 'physical assets')
-    gowtham_keywords_dict = process_keywords_to_dict(gowtham_df,'Company data - Granular segments')
-    diversity_keywords_dict = process_keywords_to_dict(diversity_df,'ENS Diversity')
-    surya_keywords_dict = process_keywords_to_dict(surya_df,'Governance annual update')
+    # Keyword catalog shared by all pages and sessions (local snapshot, refreshed in the background)
+    keyword_catalog = get_keyword_catalog()
 
     # Create dropdown for team selection
-    team_type = st.selectbox("Select Team", ["sfdr", "physical assets",'Company data','ENS Diversity','Governance annual update'])
+    team_type = st.selectbox("Select Team", TEAM_NAMES)
+    if team_type not in keyword_catalog:
+        st.warning(missing_team_message(team_type))
+        return
 
     # Display appropriate keyword dictionary based on team selection
-    if team_type == "sfdr":
-        indicators = list(sfdr_keywords_dict.keys())
-    elif team_type == "physical assets":
-        indicators = list(asset_keywords_dict.keys())
-    elif team_type == "Company data - Granular segments":
-        indicators = list(gowtham_keywords_dict.keys())
-    elif team_type == "ENS Diversity":    
-        indicators = list(diversity_keywords_dict.keys())
-    elif team_type == "Governance annual update":
-        indicators = list(surya_keywords_dict.keys())  
-    else:
-        indicators = []
+    indicators = list(keyword_catalog.get(team_type, {}).keys())
     if indicators:
         indicator = st.selectbox("Select Indicator", indicators)
     else:
@@ -215,89 +129,70 @@ def run():
         st.warning("Please select a valid indicator.")
         return
 
-    if team_type == "sfdr":
-        datapoint_names = list(sfdr_keywords_dict[indicator].keys())
-    elif team_type == "physical assets":
-        datapoint_names = list(asset_keywords_dict[indicator].keys())
-    elif team_type == "Company data - Granular segments":
-        datapoint_names = list(gowtham_keywords_dict[indicator].keys())
-    elif team_type == "ENS Diversity":    
-        datapoint_names = list(diversity_keywords_dict[indicator].keys())
-    elif team_type == "Governance annual update":
-        datapoint_names = list(surya_keywords_dict[indicator].keys())
-    else:
-        datapoint_names = []
-    
+    datapoint_names = list(keyword_catalog[team_type][indicator].keys())
+
     datapoint_name = st.multiselect("Select Datapoint Names", datapoint_names)
     
     # Keyword Text Area: Allow users to add additional keywords
     extra_keywords_input = st.text_area("Additional Keywords (comma-separated)", "")
 
     # Extract relevant keywords based on the selected datapoint names
-    selected_keywords = []
-    if team_type == "sfdr":
-        for datapoint in datapoint_name:
-            selected_keywords.extend(sfdr_keywords_dict[indicator].get(datapoint, []))
-    elif team_type == "physical assets":
-        for datapoint in datapoint_name:
-            selected_keywords.extend(asset_keywords_dict[indicator].get(datapoint, []))
-    elif team_type == "Company data - Granular segments":
-        for datapoint in datapoint_name:
-            selected_keywords.extend(gowtham_keywords_dict[indicator].get(datapoint, []))
-    elif team_type == "ENS Diversity":
-        for datapoint in datapoint_name:
-            selected_keywords.extend(diversity_keywords_dict[indicator].get(datapoint, []))                
-    elif team_type == "Governance annual update":
-        for datapoint in datapoint_name:
-            selected_keywords.extend(surya_keywords_dict[indicator].get(datapoint, []))
-    else:
-        st.write("**Keywords is not available**")
-    selected_keywords = list(set(selected_keywords))  # Remove duplicates
+    selected_keywords = keywords_for_datapoints(keyword_catalog, team_type, indicator, datapoint_name)
     
     # Add any extra keywords entered in the text area
     if extra_keywords_input:
-        extra_keywords = [keyword.strip() for keyword in extra_keywords_input.split(',')]
+        extra_keywords = [keyword.strip() for keyword in extra_keywords_input.split(',') if keyword.strip()]
         selected_keywords.extend(extra_keywords)
 
-    selected_keywords = list(set(selected_keywords))  # Remove duplicates after adding extra keywords
+    selected_keywords = list(dict.fromkeys(selected_keywords))  # Remove duplicates, keeping the selection order
     st.write(selected_keywords)
 
     # Ensure the PDF file is loaded and text chunks are extracted after the upload
     if pdf_file:
-        text_chunks, doc = extract_pdf_content(pdf_file)  # Extract text and word positions
+        chunk_store, doc, doc_hash = extract_pdf_content(pdf_file)  # Extract text and word positions
 
-        # Check if text_chunks were successfully extracted
-        if not text_chunks:
+        # Check if text chunks were successfully extracted
+        if not chunk_count(chunk_store):
             st.warning("No text extracted from the PDF. Please upload a valid PDF.")
             return
 
-        embeddings = create_embeddings(text_chunks)
-        index = build_vector_database(embeddings)  
+        # Embeddings and index are persisted per document and model, so reruns only load them
+        embeddings, index = load_or_build_index(doc_hash, chunk_store, MODEL_NAME, create_embeddings, build_vector_database, INDEX_TYPE)
 
         # Calculate keyword statistics
-        keyword_stats = calculate_keyword_statistics(text_chunks, selected_keywords)
+        keyword_stats = calculate_keyword_statistics(chunk_store, selected_keywords)
         
         # Display keyword statistics
         st.write("### Keyword Statistics")
-        stats_data = []
-        for keyword, stats in keyword_stats.items():
-            stats_data.append([keyword, stats['occurrences'], sorted(list(stats['pages']))])
-        
-        stats_df = pd.DataFrame(stats_data, columns=["Keyword", "Occurrences", "Pages"])
-        st.dataframe(stats_df)
+        st.dataframe(stats_frame(keyword_stats))
+
+        query_mode = st.radio("Query mode", ["Single query", "Batch queries"], horizontal=True)
+        top_k = st.number_input("Number of results per query", min_value=1, max_value=50, value=5, step=1)
+
+        if query_mode == "Batch queries":
+            # One question per line; all of them are answered with a single encode and search
+            queries_input = st.text_area("Enter your queries (one per line):")
+            queries = [line.strip() for line in queries_input.splitlines() if line.strip()]
+            if queries:
+                results = retrieve_contexts(queries, chunk_store, index, int(top_k), selected_keywords)
+                results_df = build_results_table(queries, results)
+                st.write("### Query Results")
+                st.dataframe(results_df)
+                st.download_button("Download results (CSV)", results_df.to_csv(index=False), file_name="query_results.csv", mime="text/csv")
+            return
 
         # User input query
         query = st.text_input("Enter your query:")
         if query:
-            results = retrieve_context(query, text_chunks, index)
+            results = retrieve_context(query, chunk_store, index, int(top_k), selected_keywords)
             for result in results:
                 # Display relevant text with page number
                 st.write(f"**Page {result[1]}**: {result[0]}")  # Display relevant sentence
                 page_number = result[1]
                 
                 # Highlight matching words and generate image of the page
-                doc_with_highlights = highlight_text_on_pdf(doc, query,selected_keywords, page_number)
-                highlighted_image = page_to_image_with_highlights(doc_with_highlights, page_number, dpi_scale=2)
+                doc_with_highlights = highlight_text_on_pdf(doc, query, selected_keywords, page_number, chunk_store_page_words(chunk_store, page_number), result[2])
+                highlighted_image = page_to_image_with_highlights(doc_with_highlights, 1, dpi_scale=2)
                 
                 # Display the page with highlights
                 st.image(highlighted_image, caption=f"Highlighted Page {page_number}")
@@ -0,0 +1,119 @@
+import argparse
+import functools
+import os
+import threading
+
+import streamlit as st
+
+# Heavy resources (sentence-transformers/torch, NLTK data) are only imported and
+# loaded on first use, so starting the app or switching pages does not pay for them.
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# NLTK data bundled with the app (see --bundle-nltk below) is searched before the
+# default locations, so deployments without network never need to download it
+LOCAL_NLTK_DATA = os.environ.get("EXTRACTOR_NLTK_DATA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"))
+NLTK_RESOURCES = {"punkt_tab": "tokenizers/punkt_tab"}
+ALLOW_NLTK_DOWNLOAD = os.environ.get("EXTRACTOR_NLTK_DOWNLOAD", "1") != "0"
+
+WARMUP_ENABLED = os.environ.get("EXTRACTOR_WARMUP", "1") != "0"
+
+# Device for the embedding model ("auto" picks CUDA, then Apple MPS, then CPU) and the
+# number of CPU threads torch may use (0 keeps torch's default)
+ENCODE_DEVICE = os.environ.get("EXTRACTOR_ENCODE_DEVICE", "auto")
+ENCODE_THREADS = int(os.environ.get("EXTRACTOR_ENCODE_THREADS", "0"))
+
+_warmup_started = False
+_warmup_lock = threading.Lock()
+
+# Function to make sure the NLTK data the extractors need is available, downloading it
+# only when it is neither bundled nor installed
+@functools.lru_cache(maxsize=None)
+def ensure_nltk_data():
+    import nltk
+
+    if LOCAL_NLTK_DATA not in nltk.data.path:
+        nltk.data.path.insert(0, LOCAL_NLTK_DATA)
+    for name, resource_path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            if not ALLOW_NLTK_DOWNLOAD:
+                raise
+            nltk.download(name, quiet=True)
+    return True
+
+# Function to get the Punkt sentence tokenizer (one per process)
+@functools.lru_cache(maxsize=None)
+def get_sentence_tokenizer():
+    ensure_nltk_data()
+    from nltk.tokenize import PunktTokenizer
+    return PunktTokenizer("english")
+
+# Function to resolve the device the embedding model runs on
+def pick_device(requested=ENCODE_DEVICE):
+    if requested != "auto":
+        return requested
+    import torch
+    if torch.cuda.is_available():
+        return "cuda"
+    mps = getattr(torch.backends, "mps", None)
+    if mps is not None and mps.is_available():
+        return "mps"
+    return "cpu"
+
+# Function to get the sentence embedding model, loaded once and shared by all sessions
+@st.cache_resource(show_spinner="Loading the embedding model...")
+def get_sentence_model(model_name=MODEL_NAME, device=ENCODE_DEVICE):
+    from sentence_transformers import SentenceTransformer
+
+    device = pick_device(device)
+    if device == "cpu" and ENCODE_THREADS > 0:
+        import torch
+        torch.set_num_threads(ENCODE_THREADS)
+    return SentenceTransformer(model_name, device=device)
+
+def _warm_up():
+    from layout_segmenter import SENTENCE_SPLITTER
+
+    try:
+        if SENTENCE_SPLITTER == "punkt":
+            get_sentence_tokenizer()
+        get_sentence_model()
+    except Exception as e:
+        print(f"Error: Background warm-up failed: {e}")
+
+# Function to load the heavy resources in a background thread after the first page is
+# drawn, so later queries do not wait for them. Runs at most once per process.
+def start_background_warmup():
+    global _warmup_started
+    with _warmup_lock:
+        if _warmup_started or not WARMUP_ENABLED:
+            return
+        _warmup_started = True
+
+    thread = threading.Thread(target=_warm_up, name="resource-warmup", daemon=True)
+    try:
+        # Let the thread use Streamlit's resource cache without "missing ScriptRunContext" warnings
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+        add_script_run_ctx(thread)
+    except ImportError:
+        pass
+    thread.start()
+
+# Function to download the NLTK data into the bundled directory next to the app
+def bundle_nltk_data(target_dir=LOCAL_NLTK_DATA):
+    import nltk
+
+    os.makedirs(target_dir, exist_ok=True)
+    for name in NLTK_RESOURCES:
+        nltk.download(name, download_dir=target_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the extractor's local resources.")
+    parser.add_argument("--bundle-nltk", action="store_true", help=f"Download the NLTK data into {LOCAL_NLTK_DATA}")
+    args = parser.parse_args()
+    if args.bundle_nltk:
+        bundle_nltk_data()
+    else:
+        parser.print_help()
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from doc_cache import CACHE_ROOT
+from embedding_store import model_signature
+from instrumentation import span, timed
+from resources import MODEL_NAME, get_sentence_model
+
+# Encoding settings (override with environment variables). A batch size of 0 picks one
+# for the model's device: large batches on a GPU, smaller ones on the CPU.
+ENCODE_BATCH_SIZE = int(os.environ.get("EXTRACTOR_ENCODE_BATCH_SIZE", "0"))
+GPU_BATCH_SIZE = 256
+CPU_BATCH_SIZE = 64
+
+# Embeddings of individual sentences are kept across documents, since boilerplate
+# (headers, footers, disclaimers) recurs on every page and across issuers.
+# One SQLite file per model version: sha1(normalized sentence) -> float32 vector, with the
+# time the row was last used. Hits refresh that time and the least recently used rows are
+# evicted, so recurring sentences stay cached. The row count is kept in cache_state
+# instead of being counted on every save.
+SENTENCE_CACHE_DIR = os.path.join(CACHE_ROOT, "sentence_embeddings")
+SENTENCE_CACHE_MAX_ROWS = int(os.environ.get("EXTRACTOR_SENTENCE_CACHE_MAX_ROWS", "2000000"))
+SQLITE_MAX_VARIABLES = 500  # Keys per SELECT ... IN (...) lookup
+
+_cache_lock = threading.Lock()
+_prepared_paths = set()
+
+# Function to normalize a sentence before deduplication. Only whitespace is collapsed:
+# the tokenizer splits on it, so the embedding does not change.
+def normalize_sentence(sentence):
+    return " ".join(sentence.split())
+
+# Function to hash a normalized sentence into its cache key
+def sentence_key(normalized_sentence):
+    return hashlib.sha1(normalized_sentence.encode("utf-8")).digest()
+
+def _cache_path(model_name):
+    signature = hashlib.sha1(model_signature(model_name).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SENTENCE_CACHE_DIR, f"{signature}.sqlite")
+
+def _connect(model_name):
+    os.makedirs(SENTENCE_CACHE_DIR, exist_ok=True)
+    path = _cache_path(model_name)
+    connection = sqlite3.connect(path, timeout=30)
+    if path not in _prepared_paths:
+        _prepare_schema(connection)
+        _prepared_paths.add(path)
+    return connection
+
+# Function to create the cache tables, or upgrade a cache written before rows had a
+# last-used time (its rows start as least recently used)
+def _prepare_schema(connection):
+    connection.execute("PRAGMA journal_mode=WAL")
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL DEFAULT 0)")
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(embeddings)")]
+        if "last_used" not in columns:
+            connection.execute("ALTER TABLE embeddings ADD COLUMN last_used INTEGER NOT NULL DEFAULT 0")
+        connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        connection.execute("CREATE TABLE IF NOT EXISTS cache_state (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        if connection.execute("SELECT 1 FROM cache_state WHERE name = 'row_count'").fetchone() is None:
+            connection.execute("INSERT INTO cache_state (name, value) SELECT 'row_count', COUNT(*) FROM embeddings")
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+# Function to look up cached embeddings and mark them as used; returns
+# {key: float32 vector} for the keys found
+@timed("embedding_cache")
+def load_cached_embeddings(keys, model_name=MODEL_NAME):
+    found = {}
+    try:
+        with _cache_lock:
+            connection = _connect(model_name)
+            try:
+                for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                    batch = keys[start:start + SQLITE_MAX_VARIABLES]
+                    placeholders = ",".join("?" * len(batch))
+                    for key, vector in connection.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch):
+                        found[key] = np.frombuffer(vector, dtype=np.float32)
+                if found:
+                    now = _now_ms()
+                    with connection:
+                        connection.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            finally:
+                connection.close()
+    except sqlite3.Error as e:
+        print(f"Error: Unable to read the sentence embedding cache: {e}")
+    return found
+
+# Function to add embeddings to the cache, dropping the least recently used rows beyond
+# the size limit
+def save_cached_embeddings(keys, embeddings, model_name=MODEL_NAME):
+    now = _now_ms()
+    rows = [(key, np.ascontiguousarray(vector, dtype=np.float32).tobytes(), now) for key, vector in zip(keys, embeddings)]
+    try:
+        with _cache_lock:
+            connection = _connect(model_name)
+            try:
+                with connection:
+                    added = connection.executemany("INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows).rowcount
+                    connection.execute("UPDATE cache_state SET value = value + ? WHERE name = 'row_count'", (added,))
+                    excess = connection.execute("SELECT value FROM cache_state WHERE name = 'row_count'").fetchone()[0] - SENTENCE_CACHE_MAX_ROWS
+                    if excess > 0:
+                        connection.execute("DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+                        connection.execute("UPDATE cache_state SET value = value - ? WHERE name = 'row_count'", (excess,))
+            finally:
+                connection.close()
+    except sqlite3.Error as e:
+        print(f"Error: Unable to write the sentence embedding cache: {e}")
+
+# Function to pick the encoding batch size for a model
+def batch_size_for(model):
+    if ENCODE_BATCH_SIZE > 0:
+        return ENCODE_BATCH_SIZE
+    return GPU_BATCH_SIZE if model.device.type == "cuda" else CPU_BATCH_SIZE
+
+# Function to encode sentences into unit-length float32 embeddings.
+# Sentences are deduplicated after whitespace normalization, looked up in the sentence
+# cache, and only the missing ones are encoded, longest first so each batch holds
+# sentences of similar length (little padding). The embeddings are then scattered back
+# to every original position, duplicates included.
+def encode_sentences(sentences, model_name=MODEL_NAME, batch_size=None, use_cache=True):
+    model = get_sentence_model(model_name)
+    dimension = model.get_sentence_embedding_dimension()
+    if not sentences:
+        return np.zeros((0, dimension), dtype=np.float32)
+
+    unique_positions = {}
+    unique_keys = []
+    unique_texts = []
+    inverse = np.empty(len(sentences), dtype=np.int64)
+    for i, sentence in enumerate(sentences):
+        text = normalize_sentence(sentence)
+        key = sentence_key(text)
+        position = unique_positions.get(key)
+        if position is None:
+            position = unique_positions[key] = len(unique_keys)
+            unique_keys.append(key)
+            unique_texts.append(text)
+        inverse[i] = position
+
+    unique_embeddings = np.empty((len(unique_keys), dimension), dtype=np.float32)
+    cached = load_cached_embeddings(unique_keys, model_name) if use_cache else {}
+    missing = []
+    for position, key in enumerate(unique_keys):
+        vector = cached.get(key)
+        if vector is not None and len(vector) == dimension:
+            unique_embeddings[position] = vector
+        else:
+            missing.append(position)
+
+    if missing:
+        missing.sort(key=lambda position: len(unique_texts[position]), reverse=True)
+        with span("encode"):
+            encoded = model.encode(
+                [unique_texts[position] for position in missing],
+                batch_size=batch_size or batch_size_for(model),
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        unique_embeddings[missing] = encoded
+        if use_cache:
+            save_cached_embeddings([unique_keys[position] for position in missing], unique_embeddings[missing], model_name)
+
+    return unique_embeddings[inverse]
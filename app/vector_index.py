@@ -0,0 +1,108 @@
+import math
+import os
+
+import faiss
+import numpy as np
+
+from instrumentation import timed
+
+# Index backends for the sentence embeddings. All of them use inner product, which is the
+# cosine similarity for the unit-length embeddings the extractors store.
+#   flat       exact search, best for a single report
+#   ivf_flat   inverted lists over k-means cells, exact vectors
+#   ivf_pq     inverted lists with product-quantized vectors (smallest memory)
+#   hnsw       graph search, no training
+#   sq8/sq_fp16  exact scan over int8 / float16 scalar-quantized vectors
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "sq_fp16"]
+
+# Default backend and search settings (override with environment variables)
+INDEX_TYPE = os.environ.get("EXTRACTOR_INDEX_TYPE", "flat")
+IVF_NPROBE = int(os.environ.get("EXTRACTOR_IVF_NPROBE", "16"))
+HNSW_M = 32
+HNSW_EF_SEARCH = int(os.environ.get("EXTRACTOR_HNSW_EF_SEARCH", "64"))
+PQ_BITS = 8
+
+# Approximate indexes need enough vectors to train on; below this size flat is used
+MIN_TRAIN_VECTORS = 10000
+TRAIN_POINTS_PER_CELL = 64  # Training sample size per IVF cell (faiss recommends 39-256)
+
+# Function to pick the number of IVF cells for a collection of n vectors
+def default_nlist(n):
+    return max(1, min(int(4 * math.sqrt(n)), n // TRAIN_POINTS_PER_CELL))
+
+# Function to pick the number of PQ sub-quantizers: the largest divisor of the dimension
+# that gives sub-vectors of at least 4 dimensions, capped at 64
+def default_pq_m(dimension):
+    for m in range(min(64, dimension // 4), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+# Function to draw the training sample for an approximate index
+def training_sample(embeddings, sample_size, seed=0):
+    if len(embeddings) <= sample_size:
+        return embeddings
+    rows = np.random.default_rng(seed).choice(len(embeddings), sample_size, replace=False)
+    return embeddings[np.sort(rows)]
+
+# Function to build a FAISS index of the given type over float32 embeddings
+@timed("index_build")
+def build_index(embeddings, index_type=INDEX_TYPE, nlist=None, pq_m=None):
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n, dimension = embeddings.shape
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose one of: {', '.join(INDEX_TYPES)}")
+    if index_type in ("ivf_flat", "ivf_pq") and n < MIN_TRAIN_VECTORS:
+        index_type = "flat"  # Too few vectors to train the cells; exact search is fast anyway
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "sq_fp16":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    else:
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m or default_pq_m(dimension), PQ_BITS, faiss.METRIC_INNER_PRODUCT)
+
+    if not index.is_trained:
+        sample_size = max((nlist or 0) * TRAIN_POINTS_PER_CELL, MIN_TRAIN_VECTORS)
+        index.train(training_sample(embeddings, sample_size))
+    index.add(embeddings)
+    configure_search(index)
+    return index
+
+# Function to set the speed/recall trade-off of an approximate index
+def configure_search(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass  # Not an IVF index
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+    return index
+
+# Function to scalar-quantize stored embeddings to float16 or int8.
+# int8 uses one symmetric scale per dimension; returns (codes, scales), scales is None for float16.
+def quantize_embeddings(embeddings, dtype="int8"):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype == "float16":
+        return embeddings.astype(np.float16), None
+    if dtype != "int8":
+        raise ValueError(f"Unsupported embedding dtype '{dtype}'")
+    scales = np.abs(embeddings).max(axis=0) / 127.0 if len(embeddings) else np.ones(embeddings.shape[1], dtype=np.float32)
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8)
+    return codes, scales
+
+# Function to turn quantized embeddings back into float32
+def dequantize_embeddings(codes, scales=None):
+    if scales is None:
+        return np.asarray(codes, dtype=np.float32)
+    return np.asarray(codes, dtype=np.float32) * scales
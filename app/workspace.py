@@ -0,0 +1,38 @@
+import os
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+import streamlit as st
+
+from doc_cache import document_hash
+
+# Per-session workspace. Uploads are opened straight from memory and the open documents
+# live in the session's own state, so sessions never share (or overwrite) a file, and
+# reruns (a checkbox click, a new query) reuse the open document instead of re-reading
+# and re-hashing the upload. Nothing is written to the working directory; the shared
+# on-disk caches (parsed pages, embeddings) are content-addressed and bounded on their own.
+SESSION_DOCUMENTS = int(os.environ.get("EXTRACTOR_SESSION_DOCUMENTS", "2"))  # Open documents kept per session
+_WORKSPACE_KEY = "_workspace_documents"
+
+# Function to get the bytes, content hash and open fitz document of an uploaded PDF.
+# Documents are keyed by the upload's id; the oldest ones are closed beyond SESSION_DOCUMENTS,
+# and everything is released with the session state when the session ends.
+def open_uploaded_pdf(uploaded_file):
+    documents = st.session_state.setdefault(_WORKSPACE_KEY, OrderedDict())
+    key = getattr(uploaded_file, "file_id", None) or (uploaded_file.name, uploaded_file.size)
+
+    entry = documents.get(key)
+    if entry is None or entry["doc"].is_closed:
+        pdf_bytes = uploaded_file.getvalue()
+        entry = {
+            "pdf_bytes": pdf_bytes,
+            "doc_hash": document_hash(pdf_bytes),
+            "doc": fitz.open(stream=pdf_bytes, filetype="pdf"),
+        }
+        documents[key] = entry
+    documents.move_to_end(key)
+
+    while len(documents) > SESSION_DOCUMENTS:
+        _, oldest = documents.popitem(last=False)
+        oldest["doc"].close()
+    return entry["pdf_bytes"], entry["doc_hash"], entry["doc"]
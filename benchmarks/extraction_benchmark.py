@@ -0,0 +1,266 @@
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+# Benchmarks of the extraction and retrieval stages on synthetic PDFs generated offline.
+# Every (stage, size) measurement runs in a fresh process with empty caches, so the
+# timings are cold and the peak memory of one stage does not leak into the next.
+#
+#   python benchmarks/extraction_benchmark.py --baseline benchmarks/baseline.json
+#
+# With --baseline, stages slower than the baseline by more than --tolerance (and by more
+# than --min-delta seconds, so sub-millisecond jitter does not count) are reported and the
+# script exits with status 1.
+#
+# benchmarks/baseline.json is the committed reference: the default settings (10, 100 and
+# 500 pages) measured on the machine in its "environment" entry. Timings only compare on
+# similar hardware, so to check a change on another machine record a baseline of the
+# unchanged tree first and compare the changed tree against it:
+#
+#   git stash && python benchmarks/extraction_benchmark.py --save-baseline /tmp/baseline.json
+#   git stash pop && python benchmarks/extraction_benchmark.py --baseline /tmp/baseline.json
+#
+# A change that is meant to move the timings refreshes the committed file in the same
+# commit (--save-baseline benchmarks/baseline.json).
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+KEYWORDS = ["Scope 3", "greenhouse gas", "gender diversity", "board independence", "water consumption", "PAI 14"]
+FILLER_WORDS = (
+    "the company report annual group business risk management sustainability strategy "
+    "performance financial year operations market value employees customers supply chain "
+    "policy governance approach targets progress investment climate energy data results "
+    "process review committee disclosure framework impact community products services"
+).split()
+
+# Keyword list sizes of the match_<n>_keywords stages: the scan cost must stay nearly flat
+# as keywords are added (one automaton pass per text, not one pass per keyword)
+KEYWORD_COUNTS = [10, 100, 1000]
+
+STAGES = ["parse", "parse_parallel", "extract_keyword_info", "extract_keyword_matches",
+          *[f"match_{count}_keywords" for count in KEYWORD_COUNTS],
+          "keyword_stats_table", "calculate_keyword_statistics", "create_embeddings", "display_pdf_pages"]
+
+# Function to generate the text of one synthetic page: sentences of 8-20 filler words, each
+# containing one of the keywords with probability keyword_density
+def synthetic_page_text(rng, words_per_page, keyword_density):
+    sentences = []
+    word_count = 0
+    while word_count < words_per_page:
+        words = rng.choices(FILLER_WORDS, k=rng.randint(8, 20))
+        if rng.random() < keyword_density:
+            words.insert(rng.randrange(len(words)), rng.choice(KEYWORDS))
+        sentences.append(" ".join(words).capitalize() + ".")
+        word_count += len(words)
+    return " ".join(sentences)
+
+# Function to build a list of count keywords: the benchmark keywords, then phrases of a
+# filler word and a made-up word that never occur, so the timing follows the scan cost
+# rather than the number of matches
+def synthetic_keywords(count, seed=0):
+    rng = random.Random(seed)
+    keywords = list(dict.fromkeys(KEYWORDS[:count]))
+    while len(keywords) < count:
+        phrase = rng.choice(FILLER_WORDS) + " " + "".join(rng.choices("bcdfghjklmnpqrstvwxz", k=6))
+        if phrase not in keywords:
+            keywords.append(phrase)
+    return keywords
+
+# Function to build a synthetic PDF with fitz and return its bytes
+def make_synthetic_pdf(pages, words_per_page=300, keyword_density=0.1, seed=0):
+    rng = random.Random(seed)
+    doc = fitz.open()
+    rect = fitz.Rect(40, 40, 555, 800)
+    fontsize = 11
+    for _ in range(pages):
+        text = synthetic_page_text(rng, words_per_page, keyword_density)
+        page = doc.new_page()
+        # Shrink the font until the page text fits the box (insert_textbox writes nothing otherwise)
+        while page.insert_textbox(rect, text, fontsize=fontsize) < 0 and fontsize > 4:
+            fontsize -= 0.5
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+def _peak_rss_bytes():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# Function to run one stage in the current (fresh) process: setup is not timed, the
+# stage itself runs `repeat` times and the median is reported
+def measure_stage(stage, pdf_path, repeat):
+    os.environ["EXTRACTOR_CACHE_DIR"] = tempfile.mkdtemp(prefix="extractor-bench-")
+    os.environ["EXTRACTOR_METRICS"] = "0"
+    sys.path.insert(0, APP_DIR)
+
+    import doc_cache
+    from chunk_store import build_chunk_store
+
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+
+    parsed = doc_cache.parse_pdf(pdf_bytes, workers=1)
+    sentence_count = sum(len(doc_cache.page_sentence_spans(parsed, i)) for i in range(parsed["page_count"]))
+    page_count = parsed["page_count"]
+
+    if stage == "parse":
+        run = lambda: doc_cache.parse_pdf(pdf_bytes, workers=1)
+    elif stage == "parse_parallel":
+        run = lambda: doc_cache.parse_pdf(pdf_bytes)
+    elif stage in ("extract_keyword_info", "extract_keyword_matches", "keyword_stats_table") or stage.startswith("match_"):
+        import keyword_extractor
+        doc_cache.load_parsed_document(pdf_bytes)  # Matching is timed on a warm parse cache
+        if stage == "extract_keyword_info":
+            run = lambda: keyword_extractor.extract_keyword_info(pdf_bytes, KEYWORDS)
+        elif stage == "extract_keyword_matches":
+            run = lambda: keyword_extractor.extract_keyword_matches(pdf_bytes, KEYWORDS)
+        elif stage.startswith("match_"):
+            keywords = synthetic_keywords(int(stage.split("_")[1]))
+            run = lambda: keyword_extractor.extract_keyword_matches(pdf_bytes, keywords)
+        else:
+            keyword_results = keyword_extractor.extract_keyword_matches(pdf_bytes, KEYWORDS)
+            # No selected keywords (the default on the query page) must give an empty table
+            assert keyword_extractor.keyword_stats_frame({}, []).empty
+            run = lambda: keyword_extractor.keyword_stats_frame(keyword_results, KEYWORDS)
+    elif stage == "calculate_keyword_statistics":
+        import query_extractor
+        chunk_store = build_chunk_store(parsed)
+        run = lambda: query_extractor.calculate_keyword_statistics(chunk_store, KEYWORDS)
+    elif stage == "create_embeddings":
+        if importlib.util.find_spec("sentence_transformers") is None:
+            return {"skipped": "sentence-transformers is not installed"}
+        import query_extractor
+        import sentence_encoder
+        from resources import get_sentence_model
+        get_sentence_model()  # Model loading is not part of the stage
+        chunk_store = build_chunk_store(parsed)
+
+        def run():
+            sentence_encoder.SENTENCE_CACHE_DIR = tempfile.mkdtemp(prefix="extractor-bench-")  # Cold sentence cache
+            return query_extractor.create_embeddings(chunk_store)
+    elif stage == "display_pdf_pages":
+        import keyword_extractor
+        import page_renderer
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        results = keyword_extractor.matches_by_page(keyword_extractor.extract_keyword_matches(pdf_bytes, KEYWORDS))
+        page_count = len(results)  # Throughput counts the rendered (matched) pages
+        sentence_count = None
+
+        def run():
+            page_renderer.clear_render_cache()
+            return keyword_extractor.display_pdf_pages(doc, parsed["doc_hash"], results.keys(), KEYWORDS)
+    else:
+        raise ValueError(f"Unknown stage '{stage}'")
+
+    peak_before = _peak_rss_bytes()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    seconds = statistics.median(timings)
+    return {
+        "seconds": seconds,
+        "pages": page_count,
+        "sentences": sentence_count,
+        "pages_per_s": page_count / seconds if seconds else None,
+        "sentences_per_s": sentence_count / seconds if seconds and sentence_count is not None else None,
+        "peak_rss_growth_mb": (_peak_rss_bytes() - peak_before) / 1024 ** 2,
+    }
+
+def _run_in_fresh_process(stage, pdf_path, repeat):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(measure_stage, stage, pdf_path, repeat).result()
+
+# Function to compare results with a baseline; returns the regressions found
+def compare_with_baseline(results, baseline, tolerance, min_delta=0.0):
+    baseline_seconds = {(row["stage"], row["document_pages"]): row.get("seconds") for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        before = baseline_seconds.get((row["stage"], row["document_pages"]))
+        if before and row.get("seconds"):
+            row["vs_baseline"] = row["seconds"] / before
+            if row["vs_baseline"] > 1 + tolerance and row["seconds"] - before > min_delta:
+                regressions.append(row)
+    return regressions
+
+def _format_number(value, digits=1):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+def print_table(results):
+    print(f"{'stage':<30} {'pages':>6} {'seconds':>9} {'pages/s':>10} {'sentences/s':>12} {'peak MB+':>9} {'vs base':>8}")
+    for row in results:
+        if "skipped" in row:
+            print(f"{row['stage']:<30} {row['document_pages']:>6} skipped: {row['skipped']}")
+            continue
+        print(f"{row['stage']:<30} {row['document_pages']:>6} {row['seconds']:>9.4f} {_format_number(row['pages_per_s']):>10} "
+              f"{_format_number(row['sentences_per_s']):>12} {row['peak_rss_growth_mb']:>9.1f} "
+              f"{_format_number(row.get('vs_baseline'), 2):>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extraction and retrieval stages on synthetic PDFs.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500], help="Document sizes to test, in pages")
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--keyword-density", type=float, default=0.1, help="Share of sentences containing a keyword")
+    parser.add_argument("--stage", action="append", choices=STAGES, help="Stage to run (repeatable, default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the median is reported")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--save-baseline", help="Write the results as the new baseline to this file")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a stage counts as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="Slowdowns below this many seconds never count as a regression")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="extractor-bench-")
+    results = []
+    for pages in args.pages:
+        pdf_path = os.path.join(work_dir, f"synthetic_{pages}.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(make_synthetic_pdf(pages, args.words_per_page, args.keyword_density))
+        for stage in args.stage or STAGES:
+            row = {"stage": stage, "document_pages": pages}
+            row.update(_run_in_fresh_process(stage, pdf_path, args.repeat))
+            results.append(row)
+            print(f"done: {stage} on {pages} pages", file=sys.stderr)
+
+    report = {
+        "settings": {"words_per_page": args.words_per_page, "keyword_density": args.keyword_density, "repeat": args.repeat},
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                        "pymupdf": fitz.VersionBind},
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != report["settings"]:
+            print(f"Warning: the baseline was recorded with other settings: {baseline.get('settings')}", file=sys.stderr)
+        regressions = compare_with_baseline(results, baseline, args.tolerance, args.min_delta)
+    print_table(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for row in regressions:
+            print(f"  {row['stage']} on {row['document_pages']} pages: {row['vs_baseline']:.2f}x the baseline time")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+# The app modules import each other by name, so make them importable from here
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import vector_index
+
+# Function to generate unit-length vectors grouped around random topics, which is closer
+# to real sentence embeddings than uniform noise
+def synthetic_embeddings(count, dimension, topics=256, spread=0.35, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, count)] + spread * rng.standard_normal((count, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+# Function to compute recall@k: the share of the exact top k found by the approximate search
+def recall_at_k(found, truth):
+    hits = sum(len(set(row[row >= 0].tolist()) & set(expected.tolist())) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+def _timed_search(index, queries, k):
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    return found, (time.perf_counter() - start) * 1000 / len(queries)
+
+def run_benchmark(embeddings, queries, k, index_types):
+    flat = vector_index.build_index(embeddings, "flat")
+    _, truth = flat.search(queries, k)
+
+    rows = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = vector_index.build_index(embeddings, index_type)
+        build_seconds = time.perf_counter() - start
+        found, query_ms = _timed_search(index, queries, k)
+        rows.append({
+            "setting": index_type,
+            "build_s": build_seconds,
+            "query_ms": query_ms,
+            "memory_mb": faiss.serialize_index(index).nbytes / 1024 ** 2,
+            f"recall@{k}": recall_at_k(found, truth),
+        })
+
+    # Stored-embedding quantization: search the dequantized vectors exactly
+    for dtype in ("float16", "int8"):
+        codes, scales = vector_index.quantize_embeddings(embeddings, dtype)
+        index = vector_index.build_index(vector_index.dequantize_embeddings(codes, scales), "flat")
+        found, query_ms = _timed_search(index, queries, k)
+        rows.append({
+            "setting": f"flat on {dtype} embeddings",
+            "build_s": 0.0,
+            "query_ms": query_ms,
+            "memory_mb": codes.nbytes / 1024 ** 2,
+            f"recall@{k}": recall_at_k(found, truth),
+        })
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure recall@k of the approximate index types against flat search.")
+    parser.add_argument("--embeddings", help="Optional .npy file of real embeddings (default: synthetic)")
+    parser.add_argument("--count", type=int, default=100000, help="Number of synthetic vectors")
+    parser.add_argument("--dimension", type=int, default=384, help="Dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("-k", type=int, default=10, help="Number of neighbours")
+    parser.add_argument("--index-type", action="append", choices=vector_index.INDEX_TYPES, help="Index type to test (repeatable, default: all)")
+    args = parser.parse_args(argv)
+
+    if args.embeddings:
+        embeddings = np.load(args.embeddings).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    else:
+        embeddings = synthetic_embeddings(args.count, args.dimension)
+
+    # Queries are perturbed copies of stored vectors, like a question close to a sentence
+    rng = np.random.default_rng(1)
+    queries = embeddings[rng.choice(len(embeddings), args.queries, replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    rows = run_benchmark(embeddings, queries, args.k, args.index_type or vector_index.INDEX_TYPES)
+    print(f"{len(embeddings)} vectors of dimension {embeddings.shape[1]}, {len(queries)} queries")
+    header = list(rows[0])
+    print("  ".join(f"{name:>28}" if i == 0 else f"{name:>10}" for i, name in enumerate(header)))
+    for row in rows:
+        print("  ".join(f"{value:>28}" if i == 0 else f"{value:>10.3f}" for i, value in enumerate(row.values())))
+
+if __name__ == "__main__":
+    main()